@@ -1,23 +1,57 @@
 """ Integration for MYPV AC-Thor"""
 import voluptuous as vol
 import logging
+from time import monotonic
 
 from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
 from homeassistant.const import (
     CONF_HOST,
     CONF_MONITORED_CONDITIONS,
+    EVENT_HOMEASSISTANT_STOP,
 )
 import homeassistant.helpers.config_validation as cv
 
 from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.core import HomeAssistant
 
-from .const import DOMAIN, SENSOR_TYPES, DATA_COORDINATOR
+from .const import (
+    DOMAIN,
+    SENSOR_TYPES,
+    DATA_COORDINATOR,
+    DATA_PLATFORMS,
+    DATA_OPTIONS,
+    DATA_SENSORS,
+    DATA_FLEET,
+    DATA_LOAD_MONITOR,
+    ENTRY_PLATFORMS,
+    ALL_PLATFORMS,
+    CONF_DERIVED,
+    CONF_EVENTS,
+    CONF_FLEET,
+    CONF_PUBLISH_INTERVAL,
+    CONF_ANOMALY_DETECTION,
+    DEFAULT_FLEET_PUBLISH_INTERVAL,
+)
 from .coordinator import MYPVDataUpdateCoordinator
+from .fleet import FleetAggregator
+from .load import LoadMonitor
+from .scheduler import async_discard_scheduler
+from .sensor import async_update_sensors
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
 
+EVENT_RULE_SCHEMA = vol.Schema(
+    {
+        vol.Required("name"): cv.string,
+        vol.Required("key"): cv.string,
+        vol.Optional("above"): vol.Any(vol.Coerce(float), cv.string),
+        vol.Optional("hysteresis", default=0): vol.Coerce(float),
+        vol.Optional("debounce", default=1): cv.positive_int,
+    }
+)
+
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
@@ -26,6 +60,8 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Required(CONF_MONITORED_CONDITIONS): vol.All(
                     cv.ensure_list, [vol.In(list(SENSOR_TYPES))]
                 ),
+                vol.Optional(CONF_DERIVED, default={}): {cv.slug: cv.string},
+                vol.Optional(CONF_EVENTS, default=[]): [EVENT_RULE_SCHEMA],
             }
         )
     },
@@ -36,6 +72,11 @@ CONFIG_SCHEMA = vol.Schema(
 async def async_setup(hass, config):
     """Platform setup, do nothing."""
     hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN][DATA_FLEET] = FleetAggregator(hass)
+    monitor = hass.data[DOMAIN][DATA_LOAD_MONITOR] = LoadMonitor(hass)
+    monitor.async_start()
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, monitor.async_stop)
+    async_setup_services(hass)
 
     if DOMAIN not in config:
         return True
@@ -48,8 +89,47 @@ async def async_setup(hass, config):
     return True
 
 
+def _entry_platforms(hass: HomeAssistant, entry: ConfigEntry, coordinator):
+    """Return the platforms that have entities for the device.
+
+    The platforms follow from setup.jsn and are kept in the entry data. As
+    long as setup.jsn never answered every platform is set up.
+    """
+    setup = coordinator.data["setup"]
+    if not setup:
+        return list(entry.data.get(ENTRY_PLATFORMS, ALL_PLATFORMS))
+    platforms = ["sensor", "button"]
+    if "devmode" in setup:
+        platforms.append("switch")
+    if "ww1boost" in setup:
+        platforms.append("number")
+    if entry.data.get(ENTRY_PLATFORMS) != platforms:
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, ENTRY_PLATFORMS: platforms}
+        )
+    return platforms
+
+
+async def _async_setup_fleet_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Set up the virtual fleet device."""
+    hass.data[DOMAIN][entry.entry_id] = {
+        DATA_PLATFORMS: ["sensor"],
+        DATA_OPTIONS: dict(entry.options),
+    }
+    fleet = hass.data[DOMAIN][DATA_FLEET]
+    fleet.async_start(entry.options.get(CONF_PUBLISH_INTERVAL, DEFAULT_FLEET_PUBLISH_INTERVAL))
+    await fleet.async_set_anomaly_detection(entry.options.get(CONF_ANOMALY_DETECTION, False))
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Load the saved entities."""
+    if entry.data.get(CONF_FLEET):
+        return await _async_setup_fleet_entry(hass, entry)
+
+    start = monotonic()
     coordinator = MYPVDataUpdateCoordinator(
         hass,
         config=entry.data,
@@ -62,22 +142,57 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
     if not coordinator.last_update_success:
+        await coordinator.async_shutdown()
         raise ConfigEntryNotReady
 
+    platforms = _entry_platforms(hass, entry, coordinator)
     hass.data[DOMAIN][entry.entry_id] = {
         DATA_COORDINATOR: coordinator,
+        DATA_PLATFORMS: platforms,
+        DATA_OPTIONS: dict(entry.options),
     }
 
-    await hass.config_entries.async_forward_entry_setups(entry, ["sensor", "switch", "button", "number"])
+    await hass.config_entries.async_forward_entry_setups(entry, platforms)
+    _LOGGER.debug("Setup of %s took %.3f s", entry.title, monotonic() - start)
 
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    if unload_ok := await hass.config_entries.async_unload_platforms(entry, ["sensor", "switch", "button", "number"]):
-        hass.data[DOMAIN].pop(entry.entry_id)
+    platforms = hass.data[DOMAIN][entry.entry_id][DATA_PLATFORMS]
+    if unload_ok := await hass.config_entries.async_unload_platforms(entry, platforms):
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        if entry.data.get(CONF_FLEET):
+            hass.data[DOMAIN][DATA_FLEET].async_stop()
+            await hass.data[DOMAIN][DATA_FLEET].async_set_anomaly_detection(False)
+            return unload_ok
+        coordinator = entry_data[DATA_COORDINATOR]
+        hass.data[DOMAIN][DATA_FLEET].async_remove(coordinator.serial_number)
+        await coordinator.async_shutdown()
+        async_discard_scheduler(hass, coordinator.host)
     return unload_ok
 
 async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """Handle options update."""
-    await hass.config_entries.async_reload(entry.entry_id)
\ No newline at end of file
+    """Apply changed options without reloading the entry."""
+    entry_data = hass.data[DOMAIN].get(entry.entry_id)
+    if entry_data is None:
+        return
+    old_options = entry_data[DATA_OPTIONS]
+    new_options = dict(entry.options)
+    if old_options == new_options:
+        return
+    entry_data[DATA_OPTIONS] = new_options
+
+    if entry.data.get(CONF_FLEET):
+        fleet = hass.data[DOMAIN][DATA_FLEET]
+        interval = new_options.get(CONF_PUBLISH_INTERVAL, DEFAULT_FLEET_PUBLISH_INTERVAL)
+        if interval != old_options.get(CONF_PUBLISH_INTERVAL, DEFAULT_FLEET_PUBLISH_INTERVAL):
+            fleet.async_start(interval)
+        anomaly_detection = new_options.get(CONF_ANOMALY_DETECTION, False)
+        if anomaly_detection != old_options.get(CONF_ANOMALY_DETECTION, False):
+            await fleet.async_set_anomaly_detection(anomaly_detection)
+        return
+
+    await entry_data[DATA_COORDINATOR].async_update_options(new_options)
+    if DATA_SENSORS in entry_data:
+        async_update_sensors(hass, entry, old_options, new_options)
\ No newline at end of file
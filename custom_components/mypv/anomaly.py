@@ -0,0 +1,293 @@
+"""Vectorized anomaly detection over recent samples of all my-PV devices."""
+from datetime import timedelta
+import logging
+from time import perf_counter
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import issue_registry as ir
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    ANOMALY_BASELINE_ALPHA,
+    ANOMALY_DRIFT,
+    ANOMALY_ELEMENT_RATIO,
+    ANOMALY_INITIAL_DEVICES,
+    ANOMALY_INTERVAL,
+    ANOMALY_MAX_PASS_TIME,
+    ANOMALY_METRICS,
+    ANOMALY_MIN_SAMPLES,
+    ANOMALY_MIN_WINDOW,
+    ANOMALY_SAMPLE_INTERVAL,
+    ANOMALY_STUCK_MIN_RANGE,
+    ANOMALY_TEMP_PS_SLOPE,
+    ANOMALY_WINDOW,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+METRIC = {key: index for index, key in enumerate(ANOMALY_METRICS)}
+
+CHECKS = (
+    "weak_element",
+    "stuck_temperature",
+    "power_supply_heating",
+    "frequency_drift",
+    "voltage_drift",
+)
+DRIFT_CHECKS = {"freq": "frequency_drift", "volt_mains": "voltage_drift"}
+BASELINES = ("temp1_range", *DRIFT_CHECKS)
+
+
+def _value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _mean(values):
+    """Return the mean per row, ignoring NaN."""
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    total = np.where(valid, values, 0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _range(values):
+    """Return max - min per row, ignoring NaN."""
+    return np.fmax.reduce(values, axis=1) - np.fmin.reduce(values, axis=1)
+
+
+def _slope(values):
+    """Return the least squares slope per row and sample, ignoring NaN."""
+    valid = ~np.isnan(values)
+    x = np.where(valid, np.arange(values.shape[1], dtype=values.dtype), 0)
+    y = np.where(valid, values, 0)
+    count = valid.sum(axis=1)
+    sum_x = x.sum(axis=1)
+    sum_y = y.sum(axis=1)
+    denominator = count * (x * x).sum(axis=1) - sum_x * sum_x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            denominator > 0, (count * (x * y).sum(axis=1) - sum_x * sum_y) / denominator, np.nan
+        )
+
+
+def _update_baseline(baseline, values, mask):
+    """Move the baselines of the masked devices towards their new values."""
+    new = np.where(np.isnan(baseline), values, baseline + (values - baseline) * ANOMALY_BASELINE_ALPHA)
+    baseline[mask] = new[mask]
+
+
+def detect(samples, baselines):
+    """Evaluate every check on a (devices, samples, metrics) array.
+
+    Returns a boolean array per check with one entry per device. The
+    baselines of each device are learned from its own history and only
+    move while the related check is not firing.
+    """
+    enough = (~np.isnan(samples)).sum(axis=1) >= ANOMALY_MIN_SAMPLES
+    findings = {}
+
+    # Heating element drawing much less than its nominal load.
+    power = samples[:, :, METRIC["power"]]
+    load = samples[:, :, METRIC["load_nom"]]
+    heating = (samples[:, :, METRIC["rel1_out"]] > 0) & (load > 0) & ~np.isnan(power)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = _mean(np.where(heating, power / load, np.nan))
+    findings["weak_element"] = (heating.sum(axis=1) >= ANOMALY_MIN_SAMPLES) & (
+        ratio < ANOMALY_ELEMENT_RATIO
+    )
+
+    # temp1 not moving at all while it usually does.
+    temp1 = METRIC["temp1"]
+    temp1_range = _range(samples[:, :, temp1])
+    stuck = enough[:, temp1] & (temp1_range == 0) & (baselines["temp1_range"] >= ANOMALY_STUCK_MIN_RANGE)
+    findings["stuck_temperature"] = stuck
+    _update_baseline(baselines["temp1_range"], temp1_range, enough[:, temp1] & ~stuck)
+
+    # Power supply heating up while the fan does not react.
+    temp_ps = METRIC["temp_ps"]
+    fan_speed = METRIC["fan_speed"]
+    findings["power_supply_heating"] = (
+        enough[:, temp_ps]
+        & enough[:, fan_speed]
+        & (_slope(samples[:, :, temp_ps]) > ANOMALY_TEMP_PS_SLOPE)
+        & (_range(samples[:, :, fan_speed]) == 0)
+    )
+
+    # Grid values of one device leaving both its own baseline and the fleet.
+    for key, check in DRIFT_CHECKS.items():
+        index = METRIC[key]
+        valid = enough[:, index]
+        mean = _mean(samples[:, :, index])
+        baseline = baselines[key]
+        drift = valid & (np.abs(mean - baseline) > ANOMALY_DRIFT[key])
+        if valid.sum() >= 3:
+            # A deviation shared by the fleet is the grid, not the device.
+            drift &= np.abs(mean - np.median(mean[valid])) > ANOMALY_DRIFT[key]
+        findings[check] = drift
+        _update_baseline(baseline, mean, valid & ~drift)
+    return findings
+
+
+class FleetAnalyzer:
+    """Keep recent samples of all devices and look for anomalies.
+
+    The latest values of every device are copied into a ring buffer of
+    shape (devices, ANOMALY_WINDOW, metrics) every ANOMALY_SAMPLE_INTERVAL.
+    Every ANOMALY_INTERVAL all devices are checked at once and findings are
+    raised as repair issues. When a pass takes longer than
+    ANOMALY_MAX_PASS_TIME the analysed window is halved.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the analyzer."""
+        self.hass = hass
+        self._rows = {}
+        self._serials = []
+        self._free = []
+        self._latest = np.full((ANOMALY_INITIAL_DEVICES, len(ANOMALY_METRICS)), np.nan, np.float32)
+        self._samples = np.full(
+            (ANOMALY_INITIAL_DEVICES, ANOMALY_WINDOW, len(ANOMALY_METRICS)), np.nan, np.float32
+        )
+        self._baselines = {key: np.full(ANOMALY_INITIAL_DEVICES, np.nan) for key in BASELINES}
+        self._position = 0
+        self._filled = 0
+        self._window = ANOMALY_WINDOW
+        self._issues = set()
+        self._unsubs = []
+        self.passes = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+
+    def as_dict(self):
+        """Return the cost of the analysis and the open findings."""
+        return {
+            "devices": len(self._rows),
+            "window": self._window,
+            "passes": self.passes,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "issues": sorted(self._issues),
+        }
+
+    @callback
+    def async_start(self):
+        """Start sampling and analysing."""
+        self._unsubs = [
+            async_track_time_interval(
+                self.hass, self._async_sample, timedelta(seconds=ANOMALY_SAMPLE_INTERVAL)
+            ),
+            async_track_time_interval(
+                self.hass, self._async_analyze, timedelta(seconds=ANOMALY_INTERVAL)
+            ),
+        ]
+
+    @callback
+    def async_stop(self):
+        """Stop and withdraw all findings."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        for issue_id in self._issues:
+            ir.async_delete_issue(self.hass, DOMAIN, issue_id)
+        self._issues.clear()
+
+    @callback
+    def async_add(self, serial, data):
+        """Remember the latest values of a device."""
+        row = self._rows.get(serial)
+        if row is None:
+            row = self._add_row(serial)
+        self._latest[row] = [_value(data.get(key)) for key in ANOMALY_METRICS]
+
+    @callback
+    def async_remove(self, serial):
+        """Forget a device and its findings."""
+        row = self._rows.pop(serial, None)
+        if row is None:
+            return
+        self._serials[row] = None
+        self._free.append(row)
+        self._latest[row] = np.nan
+        self._samples[row] = np.nan
+        for baseline in self._baselines.values():
+            baseline[row] = np.nan
+        for check in CHECKS:
+            self._set_issue(check, serial, False)
+
+    def _add_row(self, serial):
+        if self._free:
+            row = self._free.pop()
+            self._serials[row] = serial
+        else:
+            row = len(self._serials)
+            self._serials.append(serial)
+            if row == len(self._latest):
+                self._grow()
+        self._rows[serial] = row
+        return row
+
+    def _grow(self):
+        capacity = len(self._latest)
+        self._latest = np.concatenate([self._latest, np.full_like(self._latest, np.nan)])
+        self._samples = np.concatenate([self._samples, np.full_like(self._samples, np.nan)])
+        for key, baseline in self._baselines.items():
+            self._baselines[key] = np.concatenate([baseline, np.full(capacity, np.nan)])
+
+    @callback
+    def _async_sample(self, _now=None):
+        self._samples[:, self._position] = self._latest
+        self._latest.fill(np.nan)
+        self._position = (self._position + 1) % ANOMALY_WINDOW
+        self._filled = min(self._filled + 1, ANOMALY_WINDOW)
+
+    @callback
+    def _async_analyze(self, _now=None):
+        devices = len(self._serials)
+        window = min(self._window, self._filled)
+        if not devices or window < ANOMALY_MIN_SAMPLES:
+            return
+        started = perf_counter()
+        indices = (self._position - window + np.arange(window)) % ANOMALY_WINDOW
+        baselines = {key: baseline[:devices] for key, baseline in self._baselines.items()}
+        findings = detect(self._samples[:devices, indices], baselines)
+        for check, flagged in findings.items():
+            for row, serial in enumerate(self._serials):
+                if serial is not None:
+                    self._set_issue(check, serial, bool(flagged[row]))
+
+        self.last_duration = round(perf_counter() - started, 4)
+        self.max_duration = max(self.max_duration, self.last_duration)
+        self.passes += 1
+        _LOGGER.debug(
+            "Anomaly pass over %d devices and %d samples took %.1f ms",
+            devices,
+            window,
+            self.last_duration * 1000,
+        )
+        if self.last_duration > ANOMALY_MAX_PASS_TIME and self._window > ANOMALY_MIN_WINDOW:
+            self._window = max(ANOMALY_MIN_WINDOW, self._window // 2)
+            _LOGGER.debug("Anomaly window reduced to %d samples", self._window)
+
+    def _set_issue(self, check, serial, active):
+        issue_id = f"{check}_{serial}"
+        if active and issue_id not in self._issues:
+            self._issues.add(issue_id)
+            ir.async_create_issue(
+                self.hass,
+                DOMAIN,
+                issue_id,
+                is_fixable=False,
+                severity=ir.IssueSeverity.WARNING,
+                translation_key=check,
+                translation_placeholders={"device": serial},
+            )
+        elif not active and issue_id in self._issues:
+            self._issues.discard(issue_id)
+            ir.async_delete_issue(self.hass, DOMAIN, issue_id)
@@ -1,5 +1,6 @@
-import aiohttp
+import asyncio
 import logging
+from aiohttp import ClientError
 from homeassistant.components.button import ButtonEntity
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
@@ -8,6 +9,7 @@ from homeassistant.helpers.entity_registry import async_get
 from homeassistant.const import CONF_HOST
 
 from .const import DOMAIN, DATA_COORDINATOR
+from .scheduler import PRIORITY_WRITE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,6 +36,11 @@ class MYPVButton(CoordinatorEntity, ButtonEntity):
         self.serial_number = self.coordinator.data["info"]["sn"]
         self._button = f"{self.name}_{self._host}"
 
+    @property
+    def available(self) -> bool:
+        """Return False once the device did not answer within the unavailable limit."""
+        return super().available and not self.coordinator.expired("data")
+
     @property
     def name(self):
         return self._name
@@ -59,43 +66,37 @@ class MYPVButton(CoordinatorEntity, ButtonEntity):
 
     async def async_press(self) -> None:
         """Handle button press."""
-        async with aiohttp.ClientSession() as session:
-            if self._name == "Boost button":
-                async with session.get(f"http://{self._host}/data.jsn") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        boostActive = data.get("boostactive")
-                        newBoost = not boostActive
-                        async with session.get(f"http://{self._host}/data.jsn?bststrt={int(newBoost)}") as response2:
-                            if response2.status != 200:
-                                _LOGGER.error("Failed to (de-)activate boost")
-                    else:
-                        _LOGGER.error("Failed to (de-)activate boost")
-            else:
-                # Search for the WWBoost number entity by its name
-                number_entity_id = None
+        scheduler = self.coordinator.scheduler
+        if self._name == "Boost button":
+            try:
+                data = await scheduler.async_read("data.jsn", priority=PRIORITY_WRITE)
+                boostActive = data.get("boostactive")
+                newBoost = not boostActive
+                await scheduler.async_write({"bststrt": int(newBoost)})
+            except (ClientError, asyncio.TimeoutError, ValueError):
+                _LOGGER.error("Failed to (de-)activate boost")
+        else:
+            # Search for the WWBoost number entity by its name
+            number_entity_id = None
 
-                for entity in self._hass.states.async_all():
-                    if entity.domain == "number" and f"warmwassersicherstellung_{self.serial_number}" in entity.entity_id:
-                        _LOGGER.warning(f"Entity: {entity}")
-                        _LOGGER.warning(f"UNIQUE ID: {entity.attributes.get("unique_id")}")
-                        number_entity_id = entity.entity_id
-                        break
+            for entity in self._hass.states.async_all("number"):
+                if f"warmwassersicherstellung_{self.serial_number}" in entity.entity_id:
+                    number_entity_id = entity.entity_id
+                    break
 
-                if not number_entity_id:
-                    _LOGGER.error("No matching number entity found")
-                    return
+            if not number_entity_id:
+                _LOGGER.error("No matching number entity found")
+                return
 
-                _LOGGER.warning(f"Found number entity ID: {number_entity_id}")
-                number_state = self._hass.states.get(number_entity_id)
-                if number_state:
-                    try:
-                        number_value = float(number_state.state)
-                        _LOGGER.warning(f"Number value: {number_value}")
-                        async with session.get(f"http://{self._host}/data.jsn?ww1boost={number_value*10}") as response3:
-                            if response3.status != 200:
-                                _LOGGER.error("Failed to save ww1boost settings")
-                    except ValueError:
-                        _LOGGER.error(f"Failed to convert number state to float: {number_state.state}")
-                else:
-                    _LOGGER.error(f"Failed to retrieve number state for entity_id: {number_entity_id}")
\ No newline at end of file
+            _LOGGER.debug("Found number entity ID: %s", number_entity_id)
+            number_state = self._hass.states.get(number_entity_id)
+            if number_state:
+                try:
+                    number_value = float(number_state.state)
+                    await scheduler.async_write({"ww1boost": number_value*10})
+                except ValueError:
+                    _LOGGER.error(f"Failed to convert number state to float: {number_state.state}")
+                except (ClientError, asyncio.TimeoutError):
+                    _LOGGER.error("Failed to save ww1boost settings")
+            else:
+                _LOGGER.error(f"Failed to retrieve number state for entity_id: {number_entity_id}")
\ No newline at end of file
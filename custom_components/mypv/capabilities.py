@@ -0,0 +1,78 @@
+"""Capability cache of my-PV device models and firmware versions."""
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    DATA_CAPABILITIES,
+    DERIVED_SENSORS,
+    SENSOR_TYPES,
+)
+from .derived import DERIVED_FUNCTIONS, expression_dependencies
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.capabilities"
+SAVE_DELAY = 10
+
+
+def capable_sensor_types(keys) -> dict:
+    """Return the sensor types a device with the given data.jsn keys supports."""
+    keys = set(keys)
+    sensor_types = {}
+    for key, value in SENSOR_TYPES.items():
+        if value[3] == "derived":
+            available = expression_dependencies(DERIVED_SENSORS[key], DERIVED_FUNCTIONS) <= keys
+        else:
+            available = key in keys
+        if available:
+            sensor_types[key] = value[0]
+    return sensor_types
+
+
+async def async_get_capability_cache(hass: HomeAssistant) -> "CapabilityCache":
+    """Return the loaded capability cache."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_CAPABILITIES not in domain_data:
+        cache = CapabilityCache(hass)
+        await cache.async_load()
+        domain_data.setdefault(DATA_CAPABILITIES, cache)
+    return domain_data[DATA_CAPABILITIES]
+
+
+class CapabilityCache:
+    """Supported sensor types per (device model, firmware version)."""
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the cache."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._capabilities = {}
+
+    @staticmethod
+    def _key(model, firmware):
+        return f"{model}|{firmware}"
+
+    async def async_load(self):
+        """Load the cache from storage."""
+        self._capabilities = await self._store.async_load() or {}
+
+    def get(self, model, firmware):
+        """Return the cached sensor types or None."""
+        if model is None or firmware is None:
+            return None
+        return self._capabilities.get(self._key(model, firmware))
+
+    @callback
+    def async_set(self, model, firmware, sensor_types):
+        """Remember the sensor types of a model and firmware."""
+        if model is None or firmware is None:
+            return
+        key = self._key(model, firmware)
+        if self._capabilities.get(key) == sensor_types:
+            return
+        _LOGGER.debug("Capabilities of %s updated", key)
+        self._capabilities[key] = sensor_types
+        self._store.async_delay_save(lambda: self._capabilities, SAVE_DELAY)
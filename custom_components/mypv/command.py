@@ -0,0 +1,109 @@
+"""Fleet-wide commands for my-PV devices."""
+import asyncio
+import logging
+from time import monotonic
+
+from aiohttp import ClientError, ClientResponseError
+
+from homeassistant.core import HomeAssistant
+
+from .const import FLEET_COMMAND_PARAMS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Snapshot value confirming each parameter after the re-poll
+CONFIRMATIONS = {
+    "devmode": ("setup", "devmode"),
+    "ww1boost": ("setup", "ww1boost"),
+    "bststrt": ("data", "boostactive"),
+}
+
+
+def device_values(params):
+    """Convert service parameters into the values written to the devices."""
+    values = {}
+    for key in FLEET_COMMAND_PARAMS:
+        if key in params:
+            value = params[key]
+            values[key] = round(value * 10) if key == "ww1boost" else int(value)
+    return values
+
+
+def confirmed(snapshot, values) -> bool:
+    """Return True if the snapshot shows every written value."""
+    for key, value in values.items():
+        source, snapshot_key = CONFIRMATIONS[key]
+        actual = (snapshot.get(source) or {}).get(snapshot_key)
+        if key == "bststrt":
+            if bool(actual) != bool(value):
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def _describe(error) -> str:
+    """Describe a failed write without relying on str() of the error."""
+    if isinstance(error, ClientResponseError):
+        return f"HTTP {error.status}"
+    try:
+        return str(error) or repr(error)
+    except Exception:
+        return repr(error)
+
+
+async def async_apply_fleet_command(
+    hass: HomeAssistant, coordinators, values, max_parallel, timeout
+) -> dict:
+    """Write the values to every device and confirm them with one re-poll each.
+
+    At most max_parallel writes are open at the same time and every write
+    has to finish within timeout seconds of the call, devices that did not
+    make it are reported as timed out and are not re-polled. A device that
+    fails is reported as failed, the others are not affected.
+    """
+    started = monotonic()
+    deadline = hass.loop.time() + timeout
+    semaphore = asyncio.Semaphore(max_parallel)
+    outcomes = await asyncio.gather(
+        *(_async_apply(coordinator, values, semaphore, deadline) for coordinator in coordinators),
+        return_exceptions=True,
+    )
+    devices = {}
+    for coordinator, outcome in zip(coordinators, outcomes):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            # One device must not fail the command for the others.
+            _LOGGER.error("Fleet command on %s failed: %r", coordinator.host, outcome)
+            outcome = {"host": coordinator.host, "status": "failed", "error": _describe(outcome)}
+        devices[coordinator.serial_number or coordinator.host] = outcome
+    result = {"duration": round(monotonic() - started, 3), "devices": devices}
+    _LOGGER.debug("Fleet command %s applied in %.3f s", values, result["duration"])
+    return result
+
+
+async def _async_apply(coordinator, values, semaphore, deadline):
+    outcome = {"host": coordinator.host}
+    started = monotonic()
+    try:
+        async with asyncio.timeout_at(deadline):
+            async with semaphore:
+                await coordinator.scheduler.async_write(values)
+    except asyncio.TimeoutError:
+        outcome["status"] = "timeout"
+        return outcome
+    except ClientError as error:
+        outcome["status"] = "failed"
+        outcome["error"] = _describe(error)
+        return outcome
+    finally:
+        outcome["write_time"] = round(monotonic() - started, 3)
+
+    await coordinator.async_refresh()
+    outcome["status"] = "ok"
+    outcome["confirm_time"] = round(monotonic() - started, 3)
+    outcome["confirmed"] = (
+        confirmed(coordinator.data, values) if coordinator.last_update_success else None
+    )
+    return outcome
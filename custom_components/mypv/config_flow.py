@@ -6,7 +6,6 @@ import aiofiles
 import asyncio
 import json
 import socket
-from aiohttp import ClientTimeout
 from aiofiles import os as aio_os
 
 from homeassistant import config_entries
@@ -18,7 +17,40 @@ from homeassistant.const import (
 )
 from homeassistant.core import HomeAssistant, callback
 
-from .const import DOMAIN, SENSOR_TYPES, DEFAULT_MENU_OPTIONS
+from .const import (
+    DOMAIN,
+    DEFAULT_MENU_OPTIONS,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_HEARTBEAT_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    PUBLISH_POLICIES,
+    CONF_EXPORT,
+    CONF_EXPORT_RETENTION_DAYS,
+    DEFAULT_EXPORT_RETENTION_DAYS,
+    CONF_DERIVED,
+    CONF_EVENTS,
+    DATA_COORDINATOR,
+    CONF_STALE_AFTER,
+    CONF_UNAVAILABLE_AFTER,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_UNAVAILABLE_AFTER,
+    CONF_FLEET,
+    CONF_PUBLISH_INTERVAL,
+    CONF_ANOMALY_DETECTION,
+    DEFAULT_FLEET_PUBLISH_INTERVAL,
+    CONF_MAX_PARALLEL,
+    DEFAULT_BULK_MAX_PARALLEL,
+    CONF_STATISTICS,
+    STATISTICS_SENSORS,
+    CONF_PRIORITY,
+    DEFAULT_PRIORITY,
+    LOAD_INTERVAL_FACTORS,
+    SENSOR_TYPES,
+)
+from .capabilities import async_get_capability_cache, capable_sensor_types
+from .publish import deadband_option
+from .scheduler import PRIORITY_BACKGROUND, async_discard_scheduler, async_get_scheduler
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,6 +64,7 @@ def mypv_entries(hass: HomeAssistant):
     """Return the hosts for the domain."""
     return set(
         (entry.data[CONF_HOST]) for entry in hass.config_entries.async_entries(DOMAIN)
+        if CONF_HOST in entry.data
     )
 
 class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -47,6 +80,31 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self._host = None
         self._filtered_sensor_types = {}
         self._devices = {}
+        self._device_infos = {}
+        self._bulk_hosts = []
+        self._bulk_template = []
+        self._bulk_parallel = DEFAULT_BULK_MAX_PARALLEL
+        self._bulk_task = None
+        self._bulk_results = {}
+        self._probed_hosts = set()
+        self._probes = {}
+
+    @callback
+    def async_remove(self) -> None:
+        """Close the schedulers of probed hosts that did not become an entry."""
+        self._discard_schedulers(self._probed_hosts)
+
+    def _discard_schedulers(self, hosts):
+        configured = mypv_entries(self.hass)
+        for host in list(hosts):
+            if host not in configured:
+                async_discard_scheduler(self.hass, host)
+            self._probed_hosts.discard(host)
+
+    def _scheduler(self, host):
+        """Return the scheduler of a host, closed again when the flow ends."""
+        self._probed_hosts.add(host)
+        return async_get_scheduler(self.hass, host)
 
     def _host_in_configuration_exists(self, host) -> bool:
         """Return True if host exists in configuration."""
@@ -54,31 +112,65 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def _get_sensor(self, host):
         """Fetch sensor data and update _filtered_sensor_types."""
-        async with aiohttp.ClientSession() as session:
-            try:
-                timeout = ClientTimeout(total=5)
-                async with session.get(f"http://{host}/data.jsn", timeout=timeout) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        json_keys = set(data.keys())
-                        self._filtered_sensor_types = {}
-
-                        for key, value in SENSOR_TYPES.items():
-                            if key in json_keys:
-                                self._filtered_sensor_types[key] = value[0]
-                        
-                        if not self._filtered_sensor_types:
-                            _LOGGER.warning("No matching sensors found on the device.")
-                    else:
-                        self._filtered_sensor_types = {}
-                        _LOGGER.error(f"Can't connect to {host}: Bad HTTP Request status")
+        self._filtered_sensor_types = await self._probe_sensor_types(host)
+
+    async def _probe_sensor_types(self, host):
+        """Return the sensor types of a device, from the cache if possible.
+
+        Devices of the same model and firmware probed at the same time wait
+        for the first probe instead of fetching data.jsn themselves.
+        """
+        cache = await async_get_capability_cache(self.hass)
+        info = self._device_infos.get(host, {})
+        key = (info.get("device"), info.get("fwversion"))
+        cached = cache.get(*key)
+        if cached is not None:
+            return dict(cached)
 
-            except aiohttp.ClientError as e:
-                _LOGGER.error(f"Failed to connect to {host}: {e}")
-                self._filtered_sensor_types = {}
-            except asyncio.TimeoutError as e:
-                _LOGGER.error(f"Timeout error occurred on {host}: {e}")
-                self._filtered_sensor_types = {}
+        future = None
+        while None not in key and future is None:
+            pending = self._probes.get(key)
+            if pending is None:
+                future = self.hass.loop.create_future()
+                self._probes[key] = future
+                continue
+            sensor_types = await asyncio.shield(pending)
+            if sensor_types:
+                return dict(sensor_types)
+            # The first probe failed, probe this device instead.
+
+        sensor_types = {}
+        try:
+            sensor_types = await self._fetch_sensor_types(host, info, cache)
+            return sensor_types
+        finally:
+            if future is not None:
+                del self._probes[key]
+                future.set_result(sensor_types)
+
+    async def _fetch_sensor_types(self, host, info, cache):
+        try:
+            data = await self._scheduler(host).async_read("data.jsn")
+            sensor_types = capable_sensor_types(data.keys())
+
+            if not sensor_types:
+                _LOGGER.warning("No matching sensors found on the device.")
+            else:
+                cache.async_set(
+                    info.get("device", data.get("device")),
+                    data.get("fwversion", info.get("fwversion")),
+                    sensor_types,
+                )
+            return sensor_types
+        except aiohttp.ClientResponseError:
+            _LOGGER.error(f"Can't connect to {host}: Bad HTTP Request status")
+        except aiohttp.ClientError as e:
+            _LOGGER.error(f"Failed to connect to {host}: {e}")
+        except asyncio.TimeoutError as e:
+            _LOGGER.error(f"Timeout error occurred on {host}: {e}")
+        except (ValueError, AttributeError) as e:
+            _LOGGER.error(f"Invalid data.jsn from {host}: {e}")
+        return {}
 
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
@@ -92,7 +184,8 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             menu_options={
                 "ip_known": translation.get("ip_known"),
                 "ip_unknown": translation.get("ip_unknown"),
-                "automatic_scan" : translation.get("automatic_scan")
+                "automatic_scan" : translation.get("automatic_scan"),
+                "fleet": translation.get("fleet"),
             },
         )
 
@@ -166,6 +259,12 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=self._errors,
         )  
     
+    async def async_step_fleet(self, user_input=None):
+        """Create the virtual device with the totals of all devices."""
+        await self.async_set_unique_id(CONF_FLEET)
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(title="my-PV Fleet", data={CONF_FLEET: True})
+
     async def async_step_automatic_scan(self, user_input=None):
         self._devices = await self.scan_devices(self.get_subnet(self.get_own_ip()))
         if not self._devices:
@@ -175,12 +274,17 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_select_device(self, user_input=None):
         self._errors = {}
         if user_input is not None:
-            self._host = list(self._devices.keys())[list(self._devices.values()).index(user_input["device"])]
-            await self._get_sensor(self._host)
-            return await self.async_step_sensors()        
-        
+            if user_input.get("add_all"):
+                return await self.async_step_bulk_sensors()
+            if "device" in user_input:
+                self._host = list(self._devices.keys())[list(self._devices.values()).index(user_input["device"])]
+                await self._get_sensor(self._host)
+                return await self.async_step_sensors()
+            self._errors["base"] = "no_device_selected"
+
         select_device_schema = vol.Schema({
-            vol.Required("device"): vol.In(list(self._devices.values()))
+            vol.Optional("device"): vol.In(list(self._devices.values())),
+            vol.Optional("add_all", default=False): bool,
         })
         
         return self.async_show_form(
@@ -226,35 +330,29 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return None
         
     async def check_ip_device(self, ip):
-        async with aiohttp.ClientSession() as session:
-            return await self.check_device(session, ip)
-    
+        return await self.check_device(ip)
+
     async def scan_devices(self, subnet):
         devices = {}
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for i in range(1, 255):
-                ip = f"{subnet}.{i}"
-                tasks.append(self.check_device(session, ip))
-
-            results = await asyncio.gather(*tasks)
+        ips = [f"{subnet}.{i}" for i in range(1, 255)]
+        results = await asyncio.gather(*(self.check_device(ip) for ip in ips))
 
-            for ip, device_name in zip([f"{subnet}.{i}" for i in range(1, 255)], results):
-                if device_name is not None and not self._host_in_configuration_exists(ip):
-                    devices[ip] = f"{device_name} ({ip})"
+        for ip, device_name in zip(ips, results):
+            if device_name is not None and not self._host_in_configuration_exists(ip):
+                devices[ip] = f"{device_name} ({ip})"
+        self._discard_schedulers(ip for ip in ips if ip not in devices)
 
         return devices
-    
-    async def check_device(self, session, ip):
+
+    async def check_device(self, ip):
         try:
-            timeout = ClientTimeout(total=15)
-            async with session.get(f"http://{ip}/mypv_dev.jsn", timeout=timeout) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("device")
-                else:
-                    return None
-        except aiohttp.ClientError:
+            scheduler = self._scheduler(ip)
+            data = await scheduler.async_read("mypv_dev.jsn", priority=PRIORITY_BACKGROUND, timeout=15)
+            device = data.get("device")
+            if device is not None:
+                self._device_infos[ip] = data
+            return device
+        except (aiohttp.ClientError, ValueError, AttributeError):
             return None
         except asyncio.TimeoutError:
             return None
@@ -272,6 +370,8 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 data={
                     CONF_HOST: self._host,
                     CONF_MONITORED_CONDITIONS: selected_sensors,
+                    CONF_DERIVED: user_input.get(CONF_DERIVED, {}),
+                    CONF_EVENTS: user_input.get(CONF_EVENTS, []),
                     '_filtered_sensor_types': self._filtered_sensor_types,
                     'selected_sensors': selected_sensors,
                 },
@@ -290,6 +390,107 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         )
 
 
+    async def async_step_bulk_sensors(self, user_input=None):
+        """Select the devices and the sensor template for all of them."""
+        if user_input is not None:
+            self._bulk_hosts = user_input["devices"]
+            self._bulk_template = user_input[CONF_MONITORED_CONDITIONS]
+            self._bulk_parallel = user_input[CONF_MAX_PARALLEL]
+            return await self.async_step_bulk_probe()
+
+        bulk_schema = vol.Schema(
+            {
+                vol.Required("devices", default=list(self._devices)): cv.multi_select(self._devices),
+                vol.Required(
+                    CONF_MONITORED_CONDITIONS, default=DEFAULT_MONITORED_CONDITIONS
+                ): cv.multi_select({key: value[0] for key, value in SENSOR_TYPES.items()}),
+                vol.Required(CONF_MAX_PARALLEL, default=DEFAULT_BULK_MAX_PARALLEL): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=50)
+                ),
+            }
+        )
+        return self.async_show_form(step_id="bulk_sensors", data_schema=bulk_schema)
+
+    async def async_step_bulk_probe(self, user_input=None):
+        """Probe all selected devices and add them while showing the progress."""
+        if self._bulk_task is None:
+            self._bulk_task = self.hass.async_create_task(self._async_bulk_onboard())
+        if not self._bulk_task.done():
+            return self.async_show_progress(
+                step_id="bulk_probe",
+                progress_action="bulk_probe",
+                progress_task=self._bulk_task,
+                description_placeholders={"count": str(len(self._bulk_hosts))},
+            )
+        return self.async_show_progress_done(next_step_id="bulk_result")
+
+    async def async_step_bulk_result(self, user_input=None):
+        """Show the result per device."""
+        results = "\n".join(
+            f"{self._devices[host]}: {result}" for host, result in self._bulk_results.items()
+        )
+        return self.async_abort(reason="bulk_added", description_placeholders={"results": results})
+
+    async def _async_bulk_onboard(self):
+        """Probe the devices concurrently and create one entry per device."""
+        semaphore = asyncio.Semaphore(self._bulk_parallel)
+        done = 0
+
+        async def _onboard(host):
+            nonlocal done
+            try:
+                async with semaphore:
+                    sensor_types = await self._probe_sensor_types(host)
+                if not sensor_types:
+                    self._bulk_results[host] = "no connection"
+                    return
+                selected_sensors = [key for key in self._bulk_template if key in sensor_types]
+                result = await self.hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": "bulk"},
+                    data={
+                        CONF_HOST: host,
+                        "title": self._devices[host],
+                        CONF_MONITORED_CONDITIONS: selected_sensors,
+                        '_filtered_sensor_types': sensor_types,
+                    },
+                )
+                if result["type"] == "create_entry":
+                    self._bulk_results[host] = f"added with {len(selected_sensors)} sensors"
+                else:
+                    self._bulk_results[host] = result.get("reason", "not added")
+            finally:
+                done += 1
+                self.async_update_progress(done / len(self._bulk_hosts))
+
+        outcomes = await asyncio.gather(
+            *(_onboard(host) for host in self._bulk_hosts), return_exceptions=True
+        )
+        for host, outcome in zip(self._bulk_hosts, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                # One device must not fail the onboarding of the others.
+                _LOGGER.error("Onboarding %s failed: %r", host, outcome)
+                self._bulk_results[host] = f"failed: {outcome!r}"
+
+    async def async_step_bulk(self, user_input):
+        """Create an entry for a device added by the bulk onboarding."""
+        if self._host_in_configuration_exists(user_input[CONF_HOST]):
+            return self.async_abort(reason="host_exists")
+        selected_sensors = user_input[CONF_MONITORED_CONDITIONS]
+        return self.async_create_entry(
+            title=user_input["title"],
+            data={
+                CONF_HOST: user_input[CONF_HOST],
+                CONF_MONITORED_CONDITIONS: selected_sensors,
+                CONF_DERIVED: {},
+                CONF_EVENTS: [],
+                '_filtered_sensor_types': user_input['_filtered_sensor_types'],
+                'selected_sensors': selected_sensors,
+            },
+        )
+
     async def async_step_import(self, user_input=None):
         """Import a config entry."""
         if self._host_in_configuration_exists(user_input[CONF_HOST]):
@@ -303,6 +504,8 @@ class MypvConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     @staticmethod
     @callback
     def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        if config_entry.data.get(CONF_FLEET):
+            return MypvFleetOptionsFlowHandler(config_entry)
         return MypvOptionsFlowHandler(config_entry)
     
 class MypvOptionsFlowHandler(config_entries.OptionsFlow):
@@ -316,23 +519,92 @@ class MypvOptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None):
         """Manage the options."""
+        entry_data = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if entry_data is not None:
+            coordinator = entry_data[DATA_COORDINATOR]
+            cache = await async_get_capability_cache(self.hass)
+            cached = cache.get(coordinator.model, coordinator.firmware)
+            if cached is not None:
+                self.filtered_sensor_types = cached
+
         if user_input is not None:
-            return self.async_create_entry(
-                title="",
-                data={
-                    CONF_MONITORED_CONDITIONS: user_input[CONF_MONITORED_CONDITIONS],
-                },
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        schema = {
+            vol.Required(
+                CONF_MONITORED_CONDITIONS,
+                default=options.get(
+                    CONF_MONITORED_CONDITIONS, self.selected_sensors
+                ),
+            ): cv.multi_select(self.filtered_sensor_types),
+        }
+        for policy_class, (deadband, _relative) in PUBLISH_POLICIES.items():
+            key = deadband_option(policy_class)
+            schema[vol.Required(key, default=options.get(key, deadband))] = vol.All(
+                vol.Coerce(float), vol.Range(min=0)
             )
-    
+        schema[vol.Required(
+            CONF_MIN_PUBLISH_INTERVAL,
+            default=options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL),
+        )] = cv.positive_int
+        schema[vol.Required(
+            CONF_HEARTBEAT_INTERVAL,
+            default=options.get(CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL),
+        )] = cv.positive_int
+        schema[vol.Required(
+            CONF_STALE_AFTER,
+            default=options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER),
+        )] = cv.positive_int
+        schema[vol.Required(
+            CONF_UNAVAILABLE_AFTER,
+            default=options.get(CONF_UNAVAILABLE_AFTER, DEFAULT_UNAVAILABLE_AFTER),
+        )] = cv.positive_int
+        schema[vol.Required(CONF_EXPORT, default=options.get(CONF_EXPORT, False))] = bool
+        schema[vol.Required(
+            CONF_EXPORT_RETENTION_DAYS,
+            default=options.get(CONF_EXPORT_RETENTION_DAYS, DEFAULT_EXPORT_RETENTION_DAYS),
+        )] = cv.positive_int
+        schema[vol.Required(CONF_STATISTICS, default=options.get(CONF_STATISTICS, []))] = cv.multi_select(
+            {key: f"{SENSOR_TYPES[key][0]} ({key})" for key in STATISTICS_SENSORS}
+        )
+        schema[vol.Required(
+            CONF_PRIORITY, default=options.get(CONF_PRIORITY, DEFAULT_PRIORITY)
+        )] = vol.In(list(LOAD_INTERVAL_FACTORS))
+        options_schema = vol.Schema(schema)
+
+        return self.async_show_form(step_id="init", data_schema=options_schema)
+
+
+class MypvFleetOptionsFlowHandler(config_entries.OptionsFlow):
+    """Handles options of the fleet device"""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        return await self.async_step_fleet(user_input)
+
+    async def async_step_fleet(self, user_input=None):
+        """Manage the fleet options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
         options_schema = vol.Schema(
             {
                 vol.Required(
-                    CONF_MONITORED_CONDITIONS,
+                    CONF_PUBLISH_INTERVAL,
                     default=self.config_entry.options.get(
-                        CONF_MONITORED_CONDITIONS, self.selected_sensors  
+                        CONF_PUBLISH_INTERVAL, DEFAULT_FLEET_PUBLISH_INTERVAL
                     ),
-                ): cv.multi_select(self.filtered_sensor_types),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_ANOMALY_DETECTION,
+                    default=self.config_entry.options.get(CONF_ANOMALY_DETECTION, False),
+                ): bool,
             }
         )
 
-        return self.async_show_form(step_id="init", data_schema=options_schema)
\ No newline at end of file
+        return self.async_show_form(step_id="fleet", data_schema=options_schema)
@@ -2,6 +2,7 @@
 from datetime import timedelta
 
 from homeassistant.const import (
+    PERCENTAGE,
     UnitOfPower,
     UnitOfElectricPotential,
     UnitOfElectricCurrent,
@@ -12,15 +13,171 @@ from homeassistant.const import (
 DOMAIN = "mypv"
 
 DATA_COORDINATOR = "coordinator"
+DATA_FIRMWARE_ROLLOUT = "firmware_rollout"
+DATA_SCHEDULERS = "schedulers"
+DATA_CAPABILITIES = "capabilities"
+DATA_PLATFORMS = "platforms"
+DATA_OPTIONS = "options"
+DATA_SENSORS = "sensors"
+DATA_ADD_SENSORS = "add_sensors"
+DATA_FLEET = "fleet"
+
+# Entry data: platforms with entities, known once setup.jsn answered
+ENTRY_PLATFORMS = "_platforms"
+ALL_PLATFORMS = ["sensor", "button", "switch", "number"]
+
+SERVICE_UPDATE_FIRMWARE = "update_firmware"
+SERVICE_APPLY_FLEET_COMMAND = "apply_fleet_command"
+
+SIGNAL_FIRMWARE_ROLLOUT = f"{DOMAIN}_firmware_rollout"
+
+SIGNAL_FLEET_UPDATE = f"{DOMAIN}_fleet_update"
+
+EVENT_MYPV = f"{DOMAIN}_event"
 
 MIN_TIME_BETWEEN_UPDATES = timedelta(seconds=10)
 
+MAX_CONNECTIONS_PER_HOST = 1
+DEFAULT_REQUEST_TIMEOUT = 5
+MAX_RESPONSE_SIZE = 256 * 1024
+MAX_RESPONSE_HEAD_SIZE = 8 * 1024
+# Request lines kept preallocated per host, reads and recent writes
+MAX_CACHED_REQUESTS = 16
+
 DEFAULT_MENU_OPTIONS = {
         "ip_known": "IP Address",
         "ip_unknown": "IP Subnet Scan",
-        "automatic_scan": "Automatic Scan in Your Network"
+        "automatic_scan": "Automatic Scan in Your Network",
+        "fleet": "Fleet totals of all devices"
     }
 
+# Firmware update of the device via data.jsn?<param>=1
+FIRMWARE_UPDATE_PARAM = "upd"
+FIRMWARE_UPDATE_POLL_INTERVAL = 2
+FIRMWARE_UPDATE_TIMEOUT = 1800
+# upd_state, ps_upd_state, p9s_upd_state: 0 idle, 1-4 download and install,
+# every other code is an error reported by the device
+FIRMWARE_UPDATE_IDLE = 0
+FIRMWARE_UPDATE_RUNNING_STATES = (1, 2, 3, 4)
+FIRMWARE_UPDATE_STATE_KEYS = ("upd_state", "ps_upd_state", "p9s_upd_state")
+DEFAULT_FIRMWARE_MAX_PARALLEL = 2
+
+# Parameters a fleet command may set via data.jsn?<param>=<value>
+FLEET_COMMAND_PARAMS = ("devmode", "bststrt", "ww1boost")
+DEFAULT_FLEET_COMMAND_MAX_PARALLEL = 16
+DEFAULT_FLEET_COMMAND_TIMEOUT = 2
+
+WW1BOOST_MIN_VALUE = 30
+WW1BOOST_MAX_VALUE = 70
+
+FIRMWARE_VERSION_KEYS = [
+    ("fwversion", "fwversionlatest"),
+    ("psversion", "psversionlatest"),
+    ("p9sversion", "p9sversionlatest"),
+]
+
+CONF_EXPORT = "export"
+CONF_EXPORT_RETENTION_DAYS = "export_retention_days"
+
+DEFAULT_EXPORT_RETENTION_DAYS = 30
+EXPORT_DIRECTORY = "mypv_export"
+EXPORT_BATCH_SIZE = 60
+EXPORT_FLUSH_INTERVAL = 300
+EXPORT_MAX_BUFFER = 1000
+EXPORT_MAX_FILE_SIZE = 50 * 1024 * 1024
+
+CONF_FLEET = "fleet"
+CONF_PUBLISH_INTERVAL = "publish_interval"
+
+DEFAULT_FLEET_PUBLISH_INTERVAL = 30
+# screen_mode_flag values counted as heating
+FLEET_HEATING_MODES = (1, 2)
+
+FLEET_SENSORS = {
+    "power": ["Power", UnitOfPower.WATT, "mdi:lightning-bolt"],
+    "power_solar": ["Power from solar", UnitOfPower.WATT, "mdi:solar-power-variant"],
+    "power_grid": ["Power from grid", UnitOfPower.WATT, "mdi:transmission-tower-export"],
+    "solar_share": ["Solar share", PERCENTAGE, "mdi:solar-power-variant"],
+    "heating": ["Devices heating", None, "mdi:water-boiler"],
+    "errors": ["Devices with error", None, "mdi:alert-circle"],
+    "devices": ["Devices", None, "mdi:counter"],
+    "temp_ps_max": ["Highest temp power supply", UnitOfTemperature.CELSIUS, "mdi:thermometer"],
+}
+
+CONF_ANOMALY_DETECTION = "anomaly_detection"
+
+# Device values kept per sample for the fleet anomaly analysis
+ANOMALY_METRICS = ("power", "load_nom", "rel1_out", "temp1", "temp_ps", "fan_speed", "freq", "volt_mains")
+ANOMALY_SAMPLE_INTERVAL = 30
+ANOMALY_INTERVAL = 300
+ANOMALY_WINDOW = 120
+ANOMALY_MIN_WINDOW = 20
+ANOMALY_MIN_SAMPLES = 10
+ANOMALY_INITIAL_DEVICES = 16
+ANOMALY_MAX_PASS_TIME = 0.05
+ANOMALY_BASELINE_ALPHA = 0.05
+# Thresholds in raw device units (W, 0.1 °C, mHz, V)
+ANOMALY_ELEMENT_RATIO = 0.5
+ANOMALY_STUCK_MIN_RANGE = 5
+ANOMALY_TEMP_PS_SLOPE = 0.5
+ANOMALY_DRIFT = {
+    "freq": 50,
+    "volt_mains": 10,
+}
+
+CONF_MAX_PARALLEL = "max_parallel"
+DEFAULT_BULK_MAX_PARALLEL = 8
+
+CONF_STALE_AFTER = "stale_after"
+CONF_UNAVAILABLE_AFTER = "unavailable_after"
+
+DEFAULT_STALE_AFTER = 60
+DEFAULT_UNAVAILABLE_AFTER = 600
+
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+CONF_HEARTBEAT_INTERVAL = "heartbeat_interval"
+
+DEFAULT_MIN_PUBLISH_INTERVAL = 20
+DEFAULT_HEARTBEAT_INTERVAL = 600
+
+CONF_STATISTICS = "statistics"
+
+# High-rate metrics that can be imported as hourly long-term statistics
+STATISTICS_SENSORS = ["power", "power_act", "m0sum", "volt_mains", "freq", "temp1"]
+STATISTICS_PERIOD = 3600
+STATISTICS_STATE_INTERVAL = 3600
+STATISTICS_MAX_PENDING = 48
+STATISTICS_MAX_GAP = 300
+
+DATA_LOAD_MONITOR = "load_monitor"
+SIGNAL_LOAD_LEVEL = "mypv_load_level"
+
+CONF_PRIORITY = "priority"
+DEFAULT_PRIORITY = "normal"
+
+LOAD_SAMPLE_INTERVAL = 1
+LOAD_LAG_SMOOTHING = 0.3
+LOAD_RECOVER_SAMPLES = 30
+# Degradation levels entered when one of the thresholds is exceeded
+# 1. Spalte Verzögerung der Event-Loop (s)
+# 2. Spalte Länge der Executor-Warteschlange
+LOAD_THRESHOLDS = [
+    [0.1, 10],
+    [0.3, 50],
+    [0.6, 200],
+]
+LOAD_DEFER_LEVEL = 1
+LOAD_COALESCE_LEVEL = 2
+LOAD_COALESCE_DELAY = 30
+# Poll interval factor per priority and degradation level
+LOAD_INTERVAL_FACTORS = {
+    "high": [1, 1, 1, 1],
+    "normal": [1, 1, 2, 4],
+    "low": [1, 2, 4, 8],
+}
+# Sources of sensors that are deferred under load, version sensors included
+LOAD_DEFERRABLE_SOURCES = ("info", "setup")
+
 ENTITIES_NOT_TO_BE_REMOVED = ["Boost button", "Device state"]
 
 DEVICE_STATUS = {
@@ -44,10 +201,54 @@ DEVICE_STATUS = {
     }
 }
 
+# Publishing policies per sensor class
+# 1. Spalte Deadband
+# 2. Spalte Deadband relativ (Prozent vom letzten Wert) statt absolut
+PUBLISH_POLICIES = {
+    "power": [10, False],
+    "voltage": [1, False],
+    "current": [0.1, False],
+    "frequency": [0.02, False],
+    "temperature": [0.2, False],
+    "fan_speed": [5, True],
+}
+
+PUBLISH_UNIT_CLASSES = {
+    UnitOfPower.WATT: "power",
+    UnitOfElectricPotential.VOLT: "voltage",
+    UnitOfElectricCurrent.AMPERE: "current",
+    UnitOfFrequency.HERTZ: "frequency",
+    UnitOfTemperature.CELSIUS: "temperature",
+}
+
+PUBLISH_KEY_CLASSES = {
+    "fan_speed": "fan_speed",
+}
+
+CONF_DERIVED = "derived"
+CONF_EVENTS = "events"
+
+# Event rules, see events.py. Values are compared in the raw device units.
+EVENT_RULES = [
+    {"name": "target_temperature_reached", "key": "temp1", "above": "ww1target", "hysteresis": 20},
+    {"name": "boost_changed", "key": "boostactive"},
+    {"name": "error", "key": "error_state", "above": 0},
+    {"name": "control_state_changed", "key": "ctrlstate", "debounce": 2},
+]
+
+# Derived sensors: expressions over the keys of data.jsn, see derived.py
+DERIVED_SENSORS = {
+    "power_act": "int(rel1_out) * int(load_nom) + int(power_act)",
+    "screen_mode_flag": "device_status(screen_mode_flag)",
+    "power_solar_total": "power1_solar + power2_solar + power3_solar",
+    "phase_imbalance": "(max(curr_mains, curr_L2, curr_L3) - min(curr_mains, curr_L2, curr_L3)) * 100 / max(curr_mains, curr_L2, curr_L3, 1)",
+    "solar_share": "power_solar_act * 100 / max(power_solar_act + power_grid_act, 1)",
+}
+
 # 1. Spalte Sensorname
 # 2. Spalte Einheit
 # 3. Spalte Icon
-# 4. Spalte Datenquelle
+# 4. Spalte Datenquelle ("data", "setup" oder "derived")
 
 SENSOR_TYPES = {
     "device": ["Device", None, "", "data"],
@@ -55,11 +256,11 @@ SENSOR_TYPES = {
     "fwversion": ["Firmware Version", None, "mdi:numeric", "data"],
     "psversion": ["Power Supply Version", None, "mdi:numeric", "data"],
     "p9sversion": ["Power Supply Version Acthor 9", None, "mdi:numeric", "data"],
-    "screen_mode_flag": ["Screen Mode", None, "", "data"],
+    "screen_mode_flag": ["Screen Mode", None, "", "derived"],
     "status": ["Status", None, "", "data"],
     "power": ["Power", UnitOfPower.WATT, "mdi:lightning-bolt", "data"],
     "boostpower": ["Boost Power", UnitOfPower.WATT, "mdi:thermometer-lines", "data"],
-    "power_act": ["Power", UnitOfPower.WATT, "mdi:lightning-bolt", "data"],
+    "power_act": ["Power", UnitOfPower.WATT, "mdi:lightning-bolt", "derived"],
     "power_solar_act": ["Power from solar", UnitOfPower.WATT, "mdi:solar-power-variant", "data"],
     "power_grid_act": ["Power from grid", UnitOfPower.WATT, "mdi:transmission-tower-export", "data"],
     "power_ac9": ["Power Acthor 9", UnitOfPower.WATT, "mdi:lightning-bolt", "data"],
@@ -71,6 +272,8 @@ SENSOR_TYPES = {
     "power2_grid": ["power2_grid", UnitOfPower.WATT, "mdi:transmission-tower-export", "data"],
     "power3_solar": ["power3_solar", UnitOfPower.WATT, "mdi:solar-power-variant", "data"],
     "power3_grid": ["power3_grid", UnitOfPower.WATT, "mdi:transmission-tower-export", "data"],
+    "power_solar_total": ["Power from solar total", UnitOfPower.WATT, "mdi:solar-power-variant", "derived"],
+    "solar_share": ["Solar share", PERCENTAGE, "mdi:solar-power-variant", "derived"],
     "load_state": ["load_state", None, "", "data"],
     "load_nom": ["load_nom", UnitOfPower.WATT, "", "data"],
     "rel1_out": ["rel1_out", None, "mdi:electric-switch", "data"],
@@ -153,6 +356,7 @@ SENSOR_TYPES = {
     "curr_L2": ["Current L2", UnitOfElectricCurrent.AMPERE, "mdi:current-ac", "data"],
     "volt_L3": ["Volt L3", UnitOfElectricPotential.VOLT, "mdi:current-ac", "data"],
     "curr_L3": ["Current L3", UnitOfElectricCurrent.AMPERE, "mdi:current_ac", "data"],
+    "phase_imbalance": ["Phase imbalance", PERCENTAGE, "mdi:scale-unbalanced", "derived"],
     "volt_out": ["Volt out", UnitOfElectricPotential.VOLT, "mdi:flash-triangle", "data"],
     "freq": ["Frequency", UnitOfFrequency.HERTZ, "mdi:sine-wave", "data"],
     "temp_ps": ["Temp power supply", UnitOfTemperature.CELSIUS, "mdi:thermometer", "data"],
@@ -173,3 +377,17 @@ SENSOR_TYPES = {
     "mode9s": ["Operating Mode Acthor 9", None, "", "setup"],
     "Datas": ["WiFi Meter Daten", None, "", "data"],
 }
+
+
+def sensor_type_info(sensor_type):
+    """Return the SENSOR_TYPES row of a sensor, derived sensors from the config included."""
+    return SENSOR_TYPES.get(sensor_type, [sensor_type, None, "mdi:function-variant", "derived"])
+
+
+def scale_value(unit, value):
+    """Convert a raw device value into the unit of its sensor."""
+    if unit == UnitOfFrequency.HERTZ:
+        return value / 1000
+    if unit in (UnitOfTemperature.CELSIUS, UnitOfElectricCurrent.AMPERE):
+        return value / 10
+    return value
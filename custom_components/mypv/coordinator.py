@@ -1,15 +1,46 @@
 """Provides the MYPV DataUpdateCoordinator."""
+import asyncio
+from collections import ChainMap
 from datetime import timedelta
 import logging
-import requests
-import json
 
-from async_timeout import timeout
+from time import monotonic
+
+from aiohttp import ClientError
 from homeassistant.const import CONF_HOST
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    DATA_FLEET,
+    CONF_EXPORT,
+    CONF_EXPORT_RETENTION_DAYS,
+    DEFAULT_EXPORT_RETENTION_DAYS,
+    EXPORT_DIRECTORY,
+    CONF_DERIVED,
+    CONF_EVENTS,
+    CONF_STATISTICS,
+    DERIVED_SENSORS,
+    EVENT_RULES,
+    DEVICE_STATUS,
+    DATA_LOAD_MONITOR,
+    SIGNAL_LOAD_LEVEL,
+    CONF_PRIORITY,
+    DEFAULT_PRIORITY,
+    LOAD_COALESCE_DELAY,
+    LOAD_COALESCE_LEVEL,
+    LOAD_DEFER_LEVEL,
+    LOAD_INTERVAL_FACTORS,
+    CONF_UNAVAILABLE_AFTER,
+    DEFAULT_UNAVAILABLE_AFTER,
+)
+from .capabilities import async_get_capability_cache, capable_sensor_types
+from .derived import DerivedEngine
+from .events import EventEngine
+from .scheduler import async_get_scheduler
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,68 +51,281 @@ class MYPVDataUpdateCoordinator(DataUpdateCoordinator):
     def __init__(self, hass: HomeAssistant, *, config: dict, options: dict):
         """Initialize global NZBGet data updater."""
         self._host = config[CONF_HOST]
+        self.scheduler = async_get_scheduler(hass, self._host)
+        self.options = options
         self._info = None
-        self._setup = None
         self._next_update = 0
+        self._snapshot = {"data": {}, "info": None, "setup": {}, "derived": {}}
+        self._key_updated = {"data": {}, "setup": {}}
+        self._endpoint_updated = {}
+        self._endpoint_failed = set()
+        self._firmware = None
+        self.derived = DerivedEngine(
+            {**DERIVED_SENSORS, **config.get(CONF_DERIVED, {})},
+            {"device_status": self._device_status},
+        )
+        self.events = EventEngine(hass, EVENT_RULES + config.get(CONF_EVENTS, []))
+        self._coalesce_unsub = None
         # self._data = 
-        update_interval = timedelta(seconds=10)
+        self._base_interval = timedelta(seconds=10)
 
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=update_interval,
+            update_interval=self._base_interval,
+        )
+        self.exporter = self._create_exporter(options)
+        self.statistics = self._create_statistics(options)
+        self._apply_load_level()
+        self._unsub_load = async_dispatcher_connect(hass, SIGNAL_LOAD_LEVEL, self._async_load_changed)
+
+    def _create_exporter(self, options):
+        if not options.get(CONF_EXPORT):
+            return None
+        from .exporter import SampleExporter
+
+        return SampleExporter(
+            self.hass,
+            self.hass.config.path(EXPORT_DIRECTORY, self._host),
+            options.get(CONF_EXPORT_RETENTION_DAYS, DEFAULT_EXPORT_RETENTION_DAYS),
         )
 
+    def _create_statistics(self, options):
+        if not options.get(CONF_STATISTICS):
+            return None
+        from .statistics import StatisticsImporter
+
+        return StatisticsImporter(self.hass, options[CONF_STATISTICS])
+
+    async def async_update_options(self, options):
+        """Apply changed options while the coordinator keeps running."""
+        export_changed = (
+            options.get(CONF_EXPORT) != self.options.get(CONF_EXPORT)
+            or options.get(CONF_EXPORT_RETENTION_DAYS) != self.options.get(CONF_EXPORT_RETENTION_DAYS)
+        )
+        statistics_changed = options.get(CONF_STATISTICS) != self.options.get(CONF_STATISTICS)
+        self.options = options
+        self._apply_load_level()
+        if statistics_changed:
+            self.statistics = self._create_statistics(options)
+        if export_changed:
+            if self.exporter is not None:
+                await self.exporter.async_stop()
+            self.exporter = self._create_exporter(options)
+
+    async def async_shutdown(self) -> None:
+        """Stop the helpers of the coordinator."""
+        await super().async_shutdown()
+        if self._unsub_load is not None:
+            self._unsub_load()
+            self._unsub_load = None
+        if self._coalesce_unsub is not None:
+            self._coalesce_unsub()
+            self._coalesce_unsub = None
+        if self.exporter is not None:
+            await self.exporter.async_stop()
+            self.exporter = None
+
+    @property
+    def load_level(self) -> int:
+        """Return the current degradation level of the event loop."""
+        monitor = self.hass.data.get(DOMAIN, {}).get(DATA_LOAD_MONITOR)
+        return monitor.level if monitor is not None else 0
+
+    @property
+    def priority(self):
+        """Return the polling priority of the device under load."""
+        return self.options.get(CONF_PRIORITY, DEFAULT_PRIORITY)
+
+    def _apply_load_level(self):
+        """Stretch the poll interval of the device to the load level."""
+        self.update_interval = self._base_interval * LOAD_INTERVAL_FACTORS[self.priority][self.load_level]
+
+    @callback
+    def _async_load_changed(self, level):
+        self._apply_load_level()
+        if level < LOAD_DEFER_LEVEL or (level < LOAD_COALESCE_LEVEL and self._coalesce_unsub is not None):
+            # Let deferred and coalesced entities catch up.
+            self._async_flush_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update the entities, coalesced into one write per delay under load."""
+        if self.load_level < LOAD_COALESCE_LEVEL:
+            super().async_update_listeners()
+        elif self._coalesce_unsub is None:
+            self._coalesce_unsub = async_call_later(
+                self.hass, LOAD_COALESCE_DELAY, self._async_flush_listeners
+            )
+
+    @callback
+    def _async_flush_listeners(self, *_):
+        if self._coalesce_unsub is not None:
+            self._coalesce_unsub()
+            self._coalesce_unsub = None
+        super().async_update_listeners()
+
+    def as_dict(self):
+        """Return the state and resource counters of the coordinator."""
+        return {
+            "model": self.model,
+            "firmware": self._firmware,
+            "priority": self.priority,
+            "update_interval": self.update_interval.total_seconds(),
+            "last_update_success": self.last_update_success,
+            "failed_endpoints": sorted(self._endpoint_failed),
+            "snapshot_keys": {
+                source: len(values or {}) for source, values in self._snapshot.items()
+            },
+            "listeners": len(self._listeners),
+            "coalescing": self._coalesce_unsub is not None,
+            "scheduler": self.scheduler.as_dict(),
+            "exporter": self.exporter.as_dict() if self.exporter is not None else None,
+            "statistics": self.statistics.as_dict() if self.statistics is not None else None,
+        }
+
+    @property
+    def host(self):
+        """Return the host of the device."""
+        return self._host
+
+    @property
+    def serial_number(self):
+        """Return the serial number of the device."""
+        return self._info["sn"] if self._info else None
+
+    @property
+    def model(self):
+        """Return the device model."""
+        return self._info.get("device") if self._info else None
+
+    @property
+    def firmware(self):
+        """Return the firmware version of the device."""
+        return self._firmware
+
+    async def _async_update_capabilities(self, keys):
+        """Refresh the cached capabilities after a firmware change."""
+        cache = await async_get_capability_cache(self.hass)
+        cache.async_set(self.model, self._firmware, capable_sensor_types(keys))
+
+    def _device_status(self, screen_mode):
+        """Return the translated device status of a screen mode."""
+        return DEVICE_STATUS.get(self.hass.config.language, DEVICE_STATUS["en"])[screen_mode]
+
+    def age(self, source, key):
+        """Return the seconds since a key was last received, None if never.
+
+        Without a key the age of the whole endpoint is returned.
+        """
+        if source == "derived":
+            updated = self._endpoint_updated.get("data")
+        elif source == "info" or key is None:
+            updated = self._endpoint_updated.get(source)
+        else:
+            updated = self._key_updated.get(source, {}).get(key)
+        if updated is None:
+            return None
+        return monotonic() - updated
+
+    def expired(self, source, key=None) -> bool:
+        """Return True once a key is older than the unavailable limit."""
+        age = self.age(source, key)
+        return age is not None and age > self.options.get(
+            CONF_UNAVAILABLE_AFTER, DEFAULT_UNAVAILABLE_AFTER
+        )
+
+    def _merge(self, source, response):
+        """Merge an endpoint response into the snapshot."""
+        now = monotonic()
+        self._endpoint_updated[source] = now
+        if source in self._endpoint_failed:
+            self._endpoint_failed.discard(source)
+            _LOGGER.info("%s of %s is reachable again", source, self._host)
+        if source == "info":
+            self._snapshot["info"] = response
+            return
+        self._snapshot[source].update(response)
+        stamps = self._key_updated[source]
+        for key in response:
+            stamps[key] = now
+
+    def _failed(self, source):
+        if source not in self._endpoint_failed:
+            self._endpoint_failed.add(source)
+            _LOGGER.warning("Failed to fetch %s from %s, keeping the last values", source, self._host)
+
     async def _async_update_data(self) -> dict:
-        """Fetch data from NZBGet."""
+        """Fetch data from the device.
 
-        def _update_data() -> dict:
-            """Fetch data from NZBGet via sync functions."""
-            data = self.data_update()
-            if self._info is None:
-                self._info = self.info_update()
+        Every endpoint that answers is merged into the snapshot, a failed
+        endpoint keeps its last values. The update only fails while the
+        device has never delivered its info and data.
+        """
+        data = await self.data_update()
+        if data is not None:
+            self._merge("data", data)
+        else:
+            self._failed("data")
 
-            self._setup = self.setup_update()
+        if self._info is None:
+            self._info = await self.info_update()
+            if self._info is not None:
+                self._merge("info", self._info)
 
-            return {
-                "data": data,
-                "info": self._info,
-                "setup": self._setup,
-            }
+        setup = await self.setup_update()
+        if setup is not None:
+            self._merge("setup", setup)
+        else:
+            self._failed("setup")
 
-        try:
-            async with timeout(4):
-                return await self.hass.async_add_executor_job(_update_data)
-        except Exception as error:
-            raise UpdateFailed(f"Invalid response from API: {error}") from error
+        if self._info is None or not self._snapshot["data"]:
+            raise UpdateFailed(f"No response from {self._host}")
 
-    def data_update(self):
-        """Update inverter data."""
+        if data is not None:
+            if data.get("fwversion") != self._firmware:
+                self._firmware = data.get("fwversion")
+                self.hass.async_create_background_task(
+                    self._async_update_capabilities(list(data)), "mypv capabilities"
+                )
+
+            if self.exporter is not None:
+                self.exporter.async_add(self.serial_number, data)
+
+            self._snapshot["derived"] = self.derived.evaluate(self._snapshot["data"])
+            values = ChainMap(self._snapshot["derived"], self._snapshot["data"])
+            self.events.evaluate(self.serial_number, values)
+            if self.statistics is not None:
+                self.statistics.async_add(self.serial_number, values)
+
+        fleet = self.hass.data[DOMAIN].get(DATA_FLEET)
+        if fleet is not None:
+            if data is not None:
+                fleet.async_update(self.serial_number, self._snapshot["data"], self._snapshot["derived"])
+            elif self.expired("data"):
+                # Values the device sensors show as unavailable leave the totals.
+                fleet.async_remove(self.serial_number)
+
+        return self._snapshot
+
+    async def _async_fetch(self, path):
         try:
-            response = requests.get(f"http://{self._host}/data.jsn")
-            data = json.loads(response.text)
+            data = await self.scheduler.async_read(path)
             _LOGGER.debug(data)
             return data
-        except:
-            pass
+        except (ClientError, asyncio.TimeoutError, ValueError) as error:
+            _LOGGER.debug("Failed to fetch %s from %s: %s", path, self._host, error)
+            return None
 
-    def info_update(self):
+    async def data_update(self):
+        """Update inverter data."""
+        return await self._async_fetch("data.jsn")
+
+    async def info_update(self):
         """Update inverter info."""
-        try:
-            response = requests.get(f"http://{self._host}/mypv_dev.jsn")
-            info = json.loads(response.text)
-            _LOGGER.debug(info)
-            return info
-        except:
-            pass
-
-    def setup_update(self):
+        return await self._async_fetch("mypv_dev.jsn")
+
+    async def setup_update(self):
         """Update inverter info."""
-        try:
-            response = requests.get(f"http://{self._host}/setup.jsn")
-            info = json.loads(response.text)
-            _LOGGER.debug(info)
-            return info
-        except:
-            pass
\ No newline at end of file
+        return await self._async_fetch("setup.jsn")
@@ -0,0 +1,138 @@
+"""Derived metrics computed from the polled snapshot."""
+import ast
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.operator,
+    ast.unaryop,
+    ast.boolop,
+    ast.cmpop,
+)
+
+FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+    "int": int,
+    "float": float,
+}
+
+
+def parse_expression(expression):
+    """Parse an expression and return its tree and the names it uses."""
+    tree = ast.parse(expression, mode="eval")
+    names = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"Unsupported syntax in {expression!r}: {type(node).__name__}")
+        if isinstance(node, ast.Call) and not isinstance(node.func, ast.Name):
+            raise ValueError(f"Unsupported call in {expression!r}")
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+    return tree, names
+
+
+# Functions provided by the coordinator in addition to FUNCTIONS
+DERIVED_FUNCTIONS = {**FUNCTIONS, "device_status": None}
+
+
+def expression_dependencies(expression, functions=FUNCTIONS):
+    """Return the snapshot keys an expression reads."""
+    return parse_expression(expression)[1] - set(functions)
+
+
+class DerivedMetric:
+    """A compiled expression over snapshot keys."""
+
+    def __init__(self, key, expression, functions):
+        """Compile the expression."""
+        tree, names = parse_expression(expression)
+        self.key = key
+        self.expression = expression
+        self.dependencies = names - set(functions)
+        self.code = compile(tree, f"<derived {key}>", "eval")
+
+
+class DerivedEngine:
+    """Evaluate all derived metrics of a device once per poll.
+
+    Expressions are compiled once. A metric may use raw keys and other
+    derived metrics; metrics are evaluated in dependency order and only
+    recomputed when one of their inputs changed since the last poll.
+    """
+
+    def __init__(self, expressions, functions=None):
+        """Compile the expressions and order them by dependency."""
+        self._functions = {"__builtins__": {}, **FUNCTIONS, **(functions or {})}
+        metrics = {}
+        for key, expression in expressions.items():
+            try:
+                metrics[key] = DerivedMetric(key, expression, self._functions)
+            except (SyntaxError, ValueError) as error:
+                _LOGGER.error("Invalid derived sensor %s: %s", key, error)
+        self._metrics = self._order(metrics)
+        self._inputs = {}
+        self._values = {}
+
+    @staticmethod
+    def _order(metrics):
+        ordered = []
+        state = {}
+
+        def visit(metric):
+            if state.get(metric.key) == "done":
+                return True
+            if state.get(metric.key) == "visiting":
+                _LOGGER.error("Derived sensor %s has a circular dependency", metric.key)
+                return False
+            state[metric.key] = "visiting"
+            for name in metric.dependencies:
+                if name != metric.key and name in metrics and not visit(metrics[name]):
+                    return False
+            state[metric.key] = "done"
+            ordered.append(metric)
+            return True
+
+        for metric in metrics.values():
+            visit(metric)
+        return ordered
+
+    @property
+    def keys(self):
+        """Return the keys of all compiled metrics."""
+        return [metric.key for metric in self._metrics]
+
+    def evaluate(self, data) -> dict:
+        """Evaluate every metric against a data snapshot."""
+        values = {}
+        for metric in self._metrics:
+            scope = {
+                name: values[name] if name != metric.key and name in values else data.get(name)
+                for name in metric.dependencies
+            }
+            inputs = tuple(scope.values())
+            if metric.key in self._values and self._inputs.get(metric.key) == inputs:
+                values[metric.key] = self._values[metric.key]
+                continue
+            try:
+                value = eval(metric.code, self._functions, scope)
+            except Exception as error:
+                _LOGGER.debug("Derived sensor %s not available: %s", metric.key, error)
+                value = None
+            self._inputs[metric.key] = inputs
+            self._values[metric.key] = value
+            values[metric.key] = value
+        return values
@@ -0,0 +1,44 @@
+"""Diagnostics support for my-PV."""
+import asyncio
+import threading
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    DATA_COORDINATOR,
+    DATA_FLEET,
+    DATA_LOAD_MONITOR,
+    DATA_SCHEDULERS,
+)
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the resource counters of the integration and the entry."""
+    domain_data = hass.data[DOMAIN]
+    fleet = domain_data[DATA_FLEET]
+    monitor = domain_data.get(DATA_LOAD_MONITOR)
+    diagnostics = {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "resources": {
+            "tasks": len(asyncio.all_tasks()),
+            "threads": threading.active_count(),
+            "schedulers": len(domain_data.get(DATA_SCHEDULERS, {})),
+            "fleet_devices": len(fleet),
+        },
+        "load": monitor.as_dict() if monitor is not None else None,
+        "fleet": dict(fleet.totals),
+        "anomaly": fleet.analyzer.as_dict() if fleet.analyzer is not None else None,
+    }
+    coordinator = domain_data.get(entry.entry_id, {}).get(DATA_COORDINATOR)
+    if coordinator is not None:
+        diagnostics["device"] = coordinator.as_dict()
+    return diagnostics
@@ -0,0 +1,106 @@
+"""Threshold and transition events evaluated once per poll."""
+import logging
+
+from homeassistant.core import HomeAssistant
+
+from .const import EVENT_MYPV
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EventRule:
+    """A declarative rule on one snapshot key.
+
+    With "above" the rule tracks whether the value is above a threshold,
+    a number or another key, and fires when that changes. It only falls
+    back once the value dropped below the threshold minus "hysteresis".
+    Without "above" the rule fires whenever the value changes. A new
+    state must hold for "debounce" polls before the event is fired.
+    """
+
+    def __init__(self, config):
+        """Initialize the rule."""
+        self.name = config["name"]
+        self.key = config["key"]
+        self.above = config.get("above")
+        self.hysteresis = config.get("hysteresis", 0)
+        self.debounce = max(1, config.get("debounce", 1))
+        self._state = None
+        self._candidate = None
+        self._count = 0
+
+    def _threshold(self, values):
+        if isinstance(self.above, str):
+            return values.get(self.above)
+        return self.above
+
+    def _next_state(self, value, values):
+        if self.above is None:
+            return value
+        threshold = self._threshold(values)
+        if threshold is None:
+            return self._state
+        if self._state:
+            return value > threshold - self.hysteresis
+        return value > threshold
+
+    def evaluate(self, values):
+        """Return (old, new) if the rule fires for these values, else None."""
+        value = values.get(self.key)
+        if value is None:
+            return None
+        try:
+            state = self._next_state(value, values)
+        except TypeError:
+            return None
+        if self._state is None:
+            # The first poll only establishes the state.
+            self._state = state
+            return None
+        if state == self._state:
+            self._candidate = None
+            self._count = 0
+            return None
+        if state != self._candidate:
+            self._candidate = state
+            self._count = 0
+        self._count += 1
+        if self._count < self.debounce:
+            return None
+        old, self._state = self._state, state
+        self._candidate = None
+        self._count = 0
+        return old, state
+
+
+class EventEngine:
+    """Fire mypv_event bus events when a rule changes state."""
+
+    def __init__(self, hass: HomeAssistant, rules):
+        """Initialize the engine."""
+        self.hass = hass
+        self._rules = []
+        for config in rules:
+            try:
+                self._rules.append(EventRule(config))
+            except KeyError as error:
+                _LOGGER.error("Invalid event rule %s: missing %s", config, error)
+
+    def evaluate(self, serial, values):
+        """Evaluate every rule against the snapshot values."""
+        for rule in self._rules:
+            transition = rule.evaluate(values)
+            if transition is None:
+                continue
+            old, new = transition
+            self.hass.bus.async_fire(
+                EVENT_MYPV,
+                {
+                    "device": serial,
+                    "rule": rule.name,
+                    "key": rule.key,
+                    "value": values.get(rule.key),
+                    "from": old,
+                    "to": new,
+                },
+            )
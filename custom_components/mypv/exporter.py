@@ -0,0 +1,159 @@
+"""Export of raw my-PV samples to rotating local files."""
+from collections import deque
+from datetime import datetime, timedelta
+import gzip
+import logging
+import os
+from time import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    EXPORT_BATCH_SIZE,
+    EXPORT_FLUSH_INTERVAL,
+    EXPORT_MAX_BUFFER,
+    EXPORT_MAX_FILE_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _escape_key(value):
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ").replace("=", "\\=")
+
+
+def _field(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def encode_sample(serial, timestamp, data) -> str:
+    """Encode one sample as an InfluxDB line protocol line."""
+    fields = ",".join(
+        f"{_escape_key(key)}={_field(value)}"
+        for key, value in data.items()
+        if value is not None and not isinstance(value, (dict, list))
+    )
+    if not fields:
+        return ""
+    return f"mypv,device={_escape_key(serial)} {fields} {int(timestamp * 1e9)}\n"
+
+
+class SampleExporter:
+    """Append every polled sample of a device to gzip compressed files.
+
+    Samples are buffered in the event loop and written in batches by the
+    executor, one batch at a time. Files are rotated per day and when they
+    grow beyond EXPORT_MAX_FILE_SIZE, files older than the retention are
+    deleted on rotation. If the disk cannot keep up the oldest buffered
+    samples are dropped instead of blocking the poll.
+    """
+
+    def __init__(self, hass: HomeAssistant, directory, retention_days):
+        """Initialize the exporter."""
+        self.hass = hass
+        self._directory = directory
+        self._retention = timedelta(days=retention_days)
+        self._buffer = deque(maxlen=EXPORT_MAX_BUFFER)
+        self._writing = False
+        self._flush_task = None
+        self._file = None
+        self._file_day = None
+        self._file_index = 0
+        self.dropped = 0
+        self._unsub = async_track_time_interval(
+            hass, self._async_scheduled_flush, timedelta(seconds=EXPORT_FLUSH_INTERVAL)
+        )
+
+    def as_dict(self):
+        """Return the resource counters of the exporter."""
+        return {
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "writing": self._writing,
+        }
+
+    @callback
+    def async_add(self, serial, data):
+        """Queue a sample for export."""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((serial, time(), data))
+        if len(self._buffer) >= EXPORT_BATCH_SIZE and not self._writing:
+            self.hass.async_create_task(self.async_flush())
+
+    async def _async_scheduled_flush(self, _now):
+        if not self._writing:
+            await self.async_flush()
+
+    async def async_flush(self):
+        """Write the buffered samples in the executor."""
+        if self._writing or not self._buffer:
+            return
+        self._writing = True
+        batch = list(self._buffer)
+        self._buffer.clear()
+        self._flush_task = self.hass.async_create_task(self._async_write(batch))
+        await self._flush_task
+
+    async def _async_write(self, batch):
+        try:
+            await self.hass.async_add_executor_job(self._write, batch)
+        except OSError as error:
+            _LOGGER.error("Failed to export samples to %s: %s", self._directory, error)
+        finally:
+            self._writing = False
+
+    async def async_stop(self):
+        """Flush the remaining samples and close the file."""
+        self._unsub()
+        if self._flush_task is not None:
+            # The file must not be closed while a batch is written.
+            await self._flush_task
+        await self.async_flush()
+        await self.hass.async_add_executor_job(self._close)
+
+    def _write(self, batch):
+        lines = "".join(encode_sample(serial, timestamp, data) for serial, timestamp, data in batch)
+        self._rotate()
+        self._file.write(lines.encode())
+        self._file.flush()
+
+    def _rotate(self):
+        day = datetime.now().strftime("%Y-%m-%d")
+        if self._file is not None and day == self._file_day and self._file.fileobj.tell() < EXPORT_MAX_FILE_SIZE:
+            return
+        self._close()
+        os.makedirs(self._directory, exist_ok=True)
+        if day != self._file_day:
+            self._file_day = day
+            self._file_index = 0
+            self._purge()
+        path = self._path(day, self._file_index)
+        while os.path.exists(path) and os.path.getsize(path) >= EXPORT_MAX_FILE_SIZE:
+            self._file_index += 1
+            path = self._path(day, self._file_index)
+        self._file = gzip.open(path, "ab")
+
+    def _path(self, day, index):
+        suffix = f".{index}" if index else ""
+        return os.path.join(self._directory, f"{day}{suffix}.lp.gz")
+
+    def _purge(self):
+        limit = (datetime.now() - self._retention).timestamp()
+        for name in os.listdir(self._directory):
+            path = os.path.join(self._directory, name)
+            if name.endswith(".lp.gz") and os.path.getmtime(path) < limit:
+                os.remove(path)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
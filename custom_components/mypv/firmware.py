@@ -0,0 +1,195 @@
+"""Rolling firmware updates across my-PV devices."""
+import asyncio
+import logging
+from time import monotonic
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    FIRMWARE_UPDATE_IDLE,
+    FIRMWARE_UPDATE_PARAM,
+    FIRMWARE_UPDATE_POLL_INTERVAL,
+    FIRMWARE_UPDATE_RUNNING_STATES,
+    FIRMWARE_UPDATE_STATE_KEYS,
+    FIRMWARE_UPDATE_TIMEOUT,
+    FIRMWARE_VERSION_KEYS,
+    SIGNAL_FIRMWARE_ROLLOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_UPDATING = "updating"
+STATUS_DONE = "done"
+STATUS_UP_TO_DATE = "up_to_date"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+
+def update_pending(data) -> bool:
+    """Return True if any firmware part of the device has a newer version."""
+    for current, latest in FIRMWARE_VERSION_KEYS:
+        if data.get(latest) and data.get(current) != data.get(latest):
+            return True
+    return False
+
+
+def _update_states(data):
+    for key in FIRMWARE_UPDATE_STATE_KEYS:
+        try:
+            yield int(data.get(key) or FIRMWARE_UPDATE_IDLE)
+        except (TypeError, ValueError):
+            continue
+
+
+def update_running(data) -> bool:
+    """Return True while the device reports an update in progress."""
+    return bool(data.get("upd_files_left")) or any(
+        state in FIRMWARE_UPDATE_RUNNING_STATES for state in _update_states(data)
+    )
+
+
+def update_failed(data) -> bool:
+    """Return True if the device reports an error code for an update."""
+    return any(
+        state != FIRMWARE_UPDATE_IDLE and state not in FIRMWARE_UPDATE_RUNNING_STATES
+        for state in _update_states(data)
+    )
+
+
+class FirmwareRollout:
+    """Update a set of devices with a bounded number of parallel updates.
+
+    A failing device pauses the rollout: updates already running finish,
+    queued devices are not started.
+    """
+
+    def __init__(self, hass: HomeAssistant, coordinators, max_parallel):
+        """Initialize the rollout."""
+        self.hass = hass
+        self._coordinators = coordinators
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self.max_parallel = max_parallel
+        self.paused = False
+        self.started = None
+        self.finished = None
+        self.status = {c.serial_number: STATUS_QUEUED for c in coordinators}
+        self.progress = {c.serial_number: 0 for c in coordinators}
+        self._durations = []
+
+    @property
+    def running(self) -> bool:
+        """Return True until every device has been handled."""
+        return self.started is not None and self.finished is None
+
+    @property
+    def total_progress(self):
+        """Return the rollout progress in percent."""
+        if not self.progress:
+            return 100
+        return round(sum(self.progress.values()) / len(self.progress))
+
+    @property
+    def eta(self):
+        """Return the estimated seconds until the rollout is finished."""
+        if not self.running or not self._durations:
+            return None
+        remaining = sum(
+            1 for status in self.status.values() if status in (STATUS_QUEUED, STATUS_UPDATING)
+        )
+        average = sum(self._durations) / len(self._durations)
+        return round(average * remaining / self.max_parallel)
+
+    def as_dict(self):
+        """Return a summary of the rollout."""
+        return {
+            "paused": self.paused,
+            "progress": self.total_progress,
+            "eta": self.eta,
+            "devices": dict(self.status),
+        }
+
+    async def async_run(self):
+        """Run the rollout until every device is done, failed or cancelled."""
+        self.started = monotonic()
+        self._notify()
+        await asyncio.gather(*(self._async_update_device(c) for c in self._coordinators))
+        self.finished = monotonic()
+        self._notify()
+        _LOGGER.info("Firmware rollout finished: %s", self.status)
+
+    async def _async_update_device(self, coordinator):
+        async with self._semaphore:
+            serial = coordinator.serial_number
+            if self.paused:
+                self.status[serial] = STATUS_CANCELLED
+                self._notify()
+                return
+            data = coordinator.data["data"] or {}
+            if not update_pending(data):
+                self.status[serial] = STATUS_UP_TO_DATE
+                self.progress[serial] = 100
+                self._notify()
+                return
+
+            self.status[serial] = STATUS_UPDATING
+            self._notify()
+            start = monotonic()
+            try:
+                await coordinator.scheduler.async_write({FIRMWARE_UPDATE_PARAM: 1})
+                ok = await self._async_follow(coordinator)
+            except Exception as error:
+                _LOGGER.error("Firmware update of %s failed: %s", serial, error)
+                ok = False
+
+            # One full refresh for the new versions and setup of the device.
+            await coordinator.async_request_refresh()
+            if ok:
+                self.status[serial] = STATUS_DONE
+                self.progress[serial] = 100
+                self._durations.append(monotonic() - start)
+            else:
+                self.status[serial] = STATUS_FAILED
+                self.paused = True
+                _LOGGER.warning("Firmware rollout paused after %s failed", serial)
+            self._notify()
+
+    async def _async_follow(self, coordinator) -> bool:
+        """Poll data.jsn of the device quickly until the update has finished.
+
+        Only data.jsn is read, through the scheduler of the device, the
+        coordinator keeps its own interval for the full refresh.
+        """
+        serial = coordinator.serial_number
+        deadline = monotonic() + FIRMWARE_UPDATE_TIMEOUT
+        files_total = None
+        seen_running = False
+        while monotonic() < deadline:
+            await asyncio.sleep(FIRMWARE_UPDATE_POLL_INTERVAL)
+            data = await coordinator.data_update()
+            if data is None:
+                # The device reboots while installing the update.
+                continue
+            if update_failed(data):
+                _LOGGER.error(
+                    "Firmware update of %s failed with state %s",
+                    serial,
+                    {key: data.get(key) for key in FIRMWARE_UPDATE_STATE_KEYS if key in data},
+                )
+                return False
+            files_left = data.get("upd_files_left") or 0
+            if files_left and (files_total is None or files_left > files_total):
+                files_total = files_left
+            if files_total:
+                self.progress[serial] = min(99, round(100 * (files_total - files_left) / files_total))
+                self._notify()
+            if update_running(data):
+                seen_running = True
+                continue
+            if seen_running or not update_pending(data):
+                return not update_pending(data)
+        return False
+
+    def _notify(self):
+        async_dispatcher_send(self.hass, SIGNAL_FIRMWARE_ROLLOUT)
@@ -0,0 +1,153 @@
+"""Site-wide aggregates across all my-PV devices."""
+from datetime import timedelta
+from importlib import import_module
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import FLEET_HEATING_MODES, SIGNAL_FLEET_UPDATE
+
+_LOGGER = logging.getLogger(__name__)
+
+SUMS = ("power", "power_solar", "power_grid", "heating", "errors", "devices")
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def contribution(data, derived) -> dict:
+    """Return what one device adds to the fleet totals."""
+    power = derived.get("power_act")
+    if power is None:
+        power = data.get("power_act")
+    return {
+        "power": _number(power),
+        "power_solar": _number(data.get("power_solar_act")),
+        "power_grid": _number(data.get("power_grid_act")),
+        "heating": 1 if data.get("screen_mode_flag") in FLEET_HEATING_MODES else 0,
+        "errors": 1 if data.get("error_state") else 0,
+        "devices": 1,
+        "temp_ps": data.get("temp_ps"),
+    }
+
+
+class FleetAggregator:
+    """Running totals over all devices, updated from each poll's diff.
+
+    Sums are adjusted by the difference between a device's new and
+    previous contribution. The maximum power supply temperature is only
+    searched again when the hottest device cooled down.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the aggregator."""
+        self.hass = hass
+        self.totals = dict.fromkeys(SUMS, 0.0)
+        self._contributions = {}
+        self._temperatures = {}
+        self._hottest = None
+        self._dirty = False
+        self._unsub = None
+        self.analyzer = None
+
+    def __len__(self):
+        """Return the number of devices contributing to the totals."""
+        return len(self._contributions)
+
+    @property
+    def temp_ps_max(self):
+        """Return the highest power supply temperature."""
+        if self._hottest is None:
+            return None
+        return self._temperatures[self._hottest]
+
+    @property
+    def solar_share(self):
+        """Return the share of solar power in percent."""
+        total = self.totals["power_solar"] + self.totals["power_grid"]
+        if not total:
+            return None
+        return round(self.totals["power_solar"] * 100 / total, 1)
+
+    @callback
+    def async_update(self, serial, data, derived):
+        """Apply the new values of one device."""
+        new = contribution(data, derived)
+        old = self._contributions.get(serial)
+        for key in SUMS:
+            delta = new[key] - (old[key] if old else 0)
+            if delta:
+                self.totals[key] += delta
+                self._dirty = True
+        self._contributions[serial] = new
+        self._update_temperature(serial, new["temp_ps"])
+        if self.analyzer is not None:
+            self.analyzer.async_add(serial, data)
+
+    @callback
+    def async_remove(self, serial):
+        """Remove a device from the totals."""
+        if self.analyzer is not None:
+            self.analyzer.async_remove(serial)
+        old = self._contributions.pop(serial, None)
+        if old is None:
+            return
+        for key in SUMS:
+            self.totals[key] -= old[key]
+        self._update_temperature(serial, None)
+        self._dirty = True
+
+    def _update_temperature(self, serial, temperature):
+        previous = self._temperatures.get(serial)
+        if temperature is None:
+            self._temperatures.pop(serial, None)
+        else:
+            self._temperatures[serial] = temperature
+        if previous == temperature:
+            return
+        self._dirty = True
+        if serial == self._hottest and (temperature is None or temperature < previous):
+            self._hottest = max(self._temperatures, key=self._temperatures.get, default=None)
+        elif temperature is not None and (self._hottest is None or temperature > self.temp_ps_max):
+            self._hottest = serial
+
+    @callback
+    def async_start(self, interval):
+        """Publish the totals every interval seconds while they changed."""
+        self.async_stop()
+        self._dirty = True
+        self._unsub = async_track_time_interval(
+            self.hass, self._async_publish, timedelta(seconds=interval)
+        )
+
+    @callback
+    def async_stop(self):
+        """Stop publishing."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    async def async_set_anomaly_detection(self, enabled):
+        """Start or stop the anomaly analysis of the fleet."""
+        if enabled and self.analyzer is None:
+            # numpy is only loaded when the analysis is used.
+            anomaly = await self.hass.async_add_import_executor_job(
+                import_module, ".anomaly", __package__
+            )
+            self.analyzer = anomaly.FleetAnalyzer(self.hass)
+            self.analyzer.async_start()
+        elif not enabled and self.analyzer is not None:
+            self.analyzer.async_stop()
+            self.analyzer = None
+
+    @callback
+    def _async_publish(self, _now=None):
+        if self._dirty:
+            self._dirty = False
+            async_dispatcher_send(self.hass, SIGNAL_FLEET_UPDATE)
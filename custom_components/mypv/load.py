@@ -0,0 +1,100 @@
+"""Event loop load monitoring for my-PV devices."""
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    LOAD_LAG_SMOOTHING,
+    LOAD_RECOVER_SAMPLES,
+    LOAD_SAMPLE_INTERVAL,
+    LOAD_THRESHOLDS,
+    SIGNAL_LOAD_LEVEL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LoadMonitor:
+    """Derive a degradation level from event loop lag and executor queue depth.
+
+    A timer is scheduled every LOAD_SAMPLE_INTERVAL, the delay it actually
+    fires with is the loop lag. The level rises as soon as the smoothed lag
+    or the queue depth crosses a threshold and falls one step once the
+    pressure stayed below half of it for LOAD_RECOVER_SAMPLES samples.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the monitor."""
+        self.hass = hass
+        self.level = 0
+        self.lag = 0.0
+        self.executor_queue = 0
+        self._expected = None
+        self._handle = None
+        self._calm = 0
+
+    def as_dict(self):
+        """Return the measured pressure."""
+        return {
+            "level": self.level,
+            "loop_lag": round(self.lag, 3),
+            "executor_queue": self.executor_queue,
+        }
+
+    @callback
+    def async_start(self):
+        """Start sampling the event loop."""
+        if self._handle is None:
+            self._schedule()
+
+    @callback
+    def async_stop(self, *_):
+        """Stop sampling the event loop."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self.hass.loop.time() + LOAD_SAMPLE_INTERVAL
+        self._handle = self.hass.loop.call_at(self._expected, self._sample)
+
+    @callback
+    def _sample(self):
+        lag = max(0.0, self.hass.loop.time() - self._expected)
+        self.lag += (lag - self.lag) * LOAD_LAG_SMOOTHING
+        self.executor_queue = self._executor_queue()
+        self._update_level()
+        self._schedule()
+
+    def _executor_queue(self):
+        executor = getattr(self.hass.loop, "_default_executor", None)
+        work_queue = getattr(executor, "_work_queue", None)
+        return work_queue.qsize() if work_queue is not None else 0
+
+    def _pressure(self, factor=1):
+        return sum(
+            1
+            for lag, queue in LOAD_THRESHOLDS
+            if self.lag > lag * factor or self.executor_queue > queue * factor
+        )
+
+    def _update_level(self):
+        level = self._pressure()
+        if level > self.level:
+            self._calm = 0
+            self._set_level(level)
+        elif self._pressure(0.5) < self.level:
+            self._calm += 1
+            if self._calm >= LOAD_RECOVER_SAMPLES:
+                self._calm = 0
+                self._set_level(self.level - 1)
+        else:
+            self._calm = 0
+
+    def _set_level(self, level):
+        _LOGGER.info(
+            "Load level %d (loop lag %.3f s, executor queue %d)", level, self.lag, self.executor_queue
+        )
+        self.level = level
+        async_dispatcher_send(self.hass, SIGNAL_LOAD_LEVEL, level)
@@ -3,14 +3,14 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.const import UnitOfTemperature, CONF_HOST
 
-from .const import DOMAIN, DATA_COORDINATOR
+from .const import DOMAIN, DATA_COORDINATOR, WW1BOOST_MAX_VALUE, WW1BOOST_MIN_VALUE
 from .coordinator import MYPVDataUpdateCoordinator
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
-DEFAULT_MIN_VALUE = 30
-DEFAULT_MAX_VALUE = 70
+DEFAULT_MIN_VALUE = WW1BOOST_MIN_VALUE
+DEFAULT_MAX_VALUE = WW1BOOST_MAX_VALUE
 DEFAULT_STEP = 0.1
 DEFAULT_MODE = "slider"
 
@@ -30,7 +30,8 @@ class WWBoost(CoordinatorEntity, NumberEntity):
         self._host = host
         self._min_value = DEFAULT_MIN_VALUE
         self._max_value = DEFAULT_MAX_VALUE
-        self._value = float(self.coordinator.data["setup"]["ww1boost"] / 10)
+        ww1boost = self.coordinator.data["setup"].get("ww1boost")
+        self._value = float(ww1boost / 10) if ww1boost is not None else None
         self._step = DEFAULT_STEP
         self._unit_of_measurement = UnitOfTemperature.CELSIUS
         self._mode = DEFAULT_MODE
@@ -54,6 +55,11 @@ class WWBoost(CoordinatorEntity, NumberEntity):
         """Return unique id based on device serial and variable."""
         return "{} {}".format(self.serial_number, self._number)
 
+    @property
+    def available(self) -> bool:
+        """Return False once ww1boost is older than the unavailable limit."""
+        return super().available and not self.coordinator.expired("setup", "ww1boost")
+
     @property
     def name(self):
         """Return the display name of this entity."""
@@ -0,0 +1,99 @@
+"""State publishing policies for my-PV sensors."""
+from .const import (
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_MIN_PUBLISH_INTERVAL,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    PUBLISH_KEY_CLASSES,
+    PUBLISH_POLICIES,
+    PUBLISH_UNIT_CLASSES,
+    CONF_STATISTICS,
+    STATISTICS_STATE_INTERVAL,
+    sensor_type_info,
+)
+
+
+def deadband_option(policy_class):
+    """Return the options key holding the deadband of a sensor class."""
+    return f"deadband_{policy_class}"
+
+
+def publish_class(sensor_type):
+    """Return the publishing class of a sensor type or None."""
+    if sensor_type in PUBLISH_KEY_CLASSES:
+        return PUBLISH_KEY_CLASSES[sensor_type]
+    return PUBLISH_UNIT_CLASSES.get(sensor_type_info(sensor_type)[1])
+
+
+def publish_options_changed(old_options, new_options) -> bool:
+    """Return True if any option of the publishing policies changed."""
+    keys = [deadband_option(policy_class) for policy_class in PUBLISH_POLICIES]
+    keys += [CONF_MIN_PUBLISH_INTERVAL, CONF_HEARTBEAT_INTERVAL, CONF_STATISTICS]
+    return any(old_options.get(key) != new_options.get(key) for key in keys)
+
+
+def publish_policy_for(sensor_type, options):
+    """Build the publishing policy of a sensor from the entry options.
+
+    Metrics imported as long-term statistics only refresh their state on a
+    long heartbeat, the statistics carry the history.
+    """
+    if sensor_type in options.get(CONF_STATISTICS, []):
+        return PublishPolicy(
+            deadband=float("inf"),
+            relative=False,
+            min_interval=STATISTICS_STATE_INTERVAL,
+            heartbeat=STATISTICS_STATE_INTERVAL,
+        )
+    policy_class = publish_class(sensor_type)
+    if policy_class is None:
+        return None
+    deadband, relative = PUBLISH_POLICIES[policy_class]
+    return PublishPolicy(
+        deadband=options.get(deadband_option(policy_class), deadband),
+        relative=relative,
+        min_interval=options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL),
+        heartbeat=options.get(CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL),
+    )
+
+
+class PublishPolicy:
+    """Decide whether a new sensor value is worth a state write.
+
+    A value is published when it leaves the deadband around the last
+    published value and the minimum interval has passed, or when the
+    heartbeat interval has passed regardless of the value.
+    """
+
+    def __init__(self, deadband, relative, min_interval, heartbeat):
+        """Initialize the policy."""
+        self.deadband = deadband
+        self.relative = relative
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self._last_value = None
+        self._last_publish = None
+
+    def should_publish(self, value, now) -> bool:
+        """Return True and remember the value if it should be published."""
+        if self._publish(value, now):
+            self._last_value = value
+            self._last_publish = now
+            return True
+        return False
+
+    def _publish(self, value, now) -> bool:
+        if self._last_publish is None:
+            return True
+        elapsed = now - self._last_publish
+        if elapsed >= self.heartbeat:
+            return True
+        if elapsed < self.min_interval:
+            return False
+        try:
+            delta = abs(float(value) - float(self._last_value))
+        except (TypeError, ValueError):
+            return value != self._last_value
+        if self.relative:
+            return delta * 100 > self.deadband * abs(float(self._last_value))
+        return delta > self.deadband
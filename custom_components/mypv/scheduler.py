@@ -0,0 +1,169 @@
+"""Per-host request scheduling for my-PV devices."""
+import asyncio
+from collections import deque
+from functools import partial
+import heapq
+from itertools import count
+import json
+import logging
+from time import monotonic
+
+from aiohttp import ClientConnectionError
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    DATA_SCHEDULERS,
+    DEFAULT_REQUEST_TIMEOUT,
+    MAX_CONNECTIONS_PER_HOST,
+)
+from .transport import DeviceConnection
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_BACKGROUND = 2
+
+
+def async_get_scheduler(hass: HomeAssistant, host) -> "RequestScheduler":
+    """Return the shared scheduler of a host."""
+    schedulers = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_SCHEDULERS, {})
+    if host not in schedulers:
+        schedulers[host] = RequestScheduler(hass, host)
+    return schedulers[host]
+
+
+def async_discard_scheduler(hass: HomeAssistant, host) -> None:
+    """Forget and close the scheduler of a host, even if it is busy."""
+    schedulers = hass.data.get(DOMAIN, {}).get(DATA_SCHEDULERS, {})
+    scheduler = schedulers.pop(host, None)
+    if scheduler is not None:
+        scheduler.close()
+
+
+class RequestScheduler:
+    """Serialize and prioritize all requests to one device.
+
+    At most MAX_CONNECTIONS_PER_HOST requests are open at the same time.
+    Waiting requests are started by priority, writes first. A read of a
+    path that is already in flight shares the running request. Requests go
+    over one kept-alive connection to the device.
+    """
+
+    def __init__(self, hass: HomeAssistant, host, max_connections=MAX_CONNECTIONS_PER_HOST):
+        """Initialize the scheduler."""
+        self.hass = hass
+        self.host = host
+        self._connection = DeviceConnection(host)
+        self._max_connections = max_connections
+        self._active = 0
+        self._waiters = []
+        self._sequence = count()
+        self._inflight = {}
+        self._closed = False
+        self.wait_times = deque(maxlen=100)
+
+    @property
+    def idle(self) -> bool:
+        """Return True if no request is running or waiting."""
+        return not self._active and not self._waiters and not self._inflight
+
+    @property
+    def max_wait_time(self):
+        """Return the longest queue wait of the recent requests."""
+        return max(self.wait_times, default=0)
+
+    def as_dict(self):
+        """Return the resource counters of the scheduler."""
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "in_flight": len(self._inflight),
+            "max_wait_time": round(self.max_wait_time, 3),
+            "connected": self._connection.connected,
+            "connects": self._connection.connects,
+        }
+
+    def close(self):
+        """Close the connection to the device and refuse further requests.
+
+        Waiting requests fail at once, a running request finishes and the
+        connection is closed again when it is done.
+        """
+        self._closed = True
+        error = ClientConnectionError(f"Requests to {self.host} were closed")
+        for _, _, waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(error)
+        self._waiters.clear()
+        self._connection.close()
+
+    async def async_read(self, path, priority=PRIORITY_READ, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Fetch a JSON document, joining a read of the same path in flight."""
+        task = self._inflight.get(path)
+        if task is None:
+            task = self.hass.loop.create_task(self._async_request(path, priority, timeout))
+            self._inflight[path] = task
+            task.add_done_callback(partial(self._read_done, path))
+        return await asyncio.shield(task)
+
+    def _read_done(self, path, task):
+        self._inflight.pop(path, None)
+        if not task.cancelled():
+            # Mark the error as retrieved, every reader may have been cancelled.
+            task.exception()
+
+    async def async_write(self, params, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """Set device parameters through data.jsn."""
+        query = "&".join(f"{key}={value}" for key, value in params.items())
+        await self._async_request(f"data.jsn?{query}", PRIORITY_WRITE, timeout, parse=False)
+
+    async def _async_request(self, path, priority, timeout, parse=True):
+        if self._closed:
+            raise ClientConnectionError(f"Requests to {self.host} were closed")
+        await self._async_acquire(priority)
+        try:
+            body = await self._connection.async_get(path, timeout)
+        finally:
+            self._release()
+            if self._closed:
+                # The request may have reconnected after close().
+                self._connection.close()
+        if parse:
+            return json.loads(body)
+        return None
+
+    async def _async_acquire(self, priority):
+        queued = monotonic()
+        if self._active < self._max_connections and not self._waiters:
+            self._active += 1
+        else:
+            waiter = self.hass.loop.create_future()
+            entry = (priority, next(self._sequence), waiter)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just before the cancellation.
+                    self._release()
+                elif entry in self._waiters:
+                    # Do not keep cancelled waiters until the next release.
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+        wait_time = monotonic() - queued
+        self.wait_times.append(wait_time)
+        if wait_time > 1:
+            _LOGGER.debug("Request to %s waited %.2f s in the queue", self.host, wait_time)
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot over to the next waiter.
+                waiter.set_result(None)
+                return
+        self._active -= 1
@@ -1,81 +1,194 @@
 """The my-PV integration."""
 
 import logging
+from time import monotonic
+
 from homeassistant.const import CONF_MONITORED_CONDITIONS
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity, EntityCategory
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.const import (
-    UnitOfElectricCurrent,
-    UnitOfFrequency,
-    UnitOfTemperature,
-)
+from homeassistant.const import UnitOfTemperature
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
-from .const import SENSOR_TYPES, DOMAIN, DATA_COORDINATOR, ENTITIES_NOT_TO_BE_REMOVED, DEVICE_STATUS
+from .const import (
+    DOMAIN,
+    DATA_COORDINATOR,
+    DATA_FIRMWARE_ROLLOUT,
+    DATA_SENSORS,
+    DATA_ADD_SENSORS,
+    DATA_FLEET,
+    CONF_FLEET,
+    FLEET_SENSORS,
+    SIGNAL_FLEET_UPDATE,
+    CONF_DERIVED,
+    SIGNAL_FIRMWARE_ROLLOUT,
+    CONF_STALE_AFTER,
+    CONF_UNAVAILABLE_AFTER,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_UNAVAILABLE_AFTER,
+    sensor_type_info,
+    scale_value,
+    SIGNAL_LOAD_LEVEL,
+    LOAD_DEFER_LEVEL,
+    LOAD_DEFERRABLE_SOURCES,
+)
 from .coordinator import MYPVDataUpdateCoordinator
+from .publish import publish_options_changed, publish_policy_for
 
 _LOGGER = logging.getLogger(__name__)
 
 from homeassistant.helpers.entity_registry import async_get
 
-async def async_setup_entry(hass, entry, async_add_entities):
-    """Add or update my-PV entry."""
-    coordinator: MYPVDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
 
-    if CONF_MONITORED_CONDITIONS in entry.options:
-        configured_sensors = entry.options[CONF_MONITORED_CONDITIONS]
+def monitored_sensors(entry, options):
+    """Return the sensor keys an entry monitors with the given options."""
+    if CONF_MONITORED_CONDITIONS in options:
+        configured_sensors = list(options[CONF_MONITORED_CONDITIONS])
     else:
-        configured_sensors = entry.data[CONF_MONITORED_CONDITIONS]
+        configured_sensors = list(entry.data[CONF_MONITORED_CONDITIONS])
+    return configured_sensors + [
+        key for key in entry.data.get(CONF_DERIVED, {}) if key not in configured_sensors
+    ]
 
-   
-    entity_registry = async_get(hass)
 
-    
-    current_entities = []
-    for entity in entity_registry.entities.values():
-        if entity.platform == DOMAIN and entity.config_entry_id == entry.entry_id:
-            current_entities.append(entity)
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Add or update my-PV entry."""
+    if entry.data.get(CONF_FLEET):
+        fleet = hass.data[DOMAIN][DATA_FLEET]
+        async_add_entities([FleetSensor(fleet, key, entry.title) for key in FLEET_SENSORS])
+        return
 
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    coordinator: MYPVDataUpdateCoordinator = entry_data[DATA_COORDINATOR]
+    configured_sensors = monitored_sensors(entry, entry.options)
 
-    _LOGGER.warning(f"Current Entities: {current_entities}")
+    entities = {
+        sensor: MypvDevice(coordinator, sensor, entry.title, publish_policy_for(sensor, entry.options))
+        for sensor in configured_sensors
+    }
+    extra_sensors = [
+        FirmwareUpdateSensor(coordinator, entry.title),
+        LoadLevelSensor(coordinator, entry.title),
+    ]
 
-    sensors_to_remove = []
-    for entity in current_entities:
-        if entity.entity_id not in configured_sensors:
-            sensors_to_remove.append(entity)
+    # Drop registry entries of sensors that are no longer monitored.
+    entity_registry = async_get(hass)
+    unique_ids = {entity.unique_id for entity in entities.values()}
+    unique_ids.update(entity.unique_id for entity in extra_sensors)
+    for entity in list(entity_registry.entities.values()):
+        if (
+            entity.platform == DOMAIN
+            and entity.domain == "sensor"
+            and entity.config_entry_id == entry.entry_id
+            and entity.unique_id not in unique_ids
+        ):
+            entity_registry.async_remove(entity.entity_id)
+
+    entry_data[DATA_SENSORS] = entities
+    entry_data[DATA_ADD_SENSORS] = async_add_entities
+    async_add_entities([*entities.values(), *extra_sensors])
 
 
-    _LOGGER.warning(f"Sensors to remove: {sensors_to_remove}")
-    _LOGGER.warning(f"Configured sensors: {configured_sensors}")
+@callback
+def async_update_sensors(hass, entry, old_options, new_options):
+    """Apply changed options to the running sensors of an entry."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = entry_data[DATA_COORDINATOR]
+    entities = entry_data[DATA_SENSORS]
+    old_sensors = monitored_sensors(entry, old_options)
+    new_sensors = monitored_sensors(entry, new_options)
 
-    for entity in sensors_to_remove:
-        entity_registry.async_remove(entity.entity_id)
+    removed = set(old_sensors) - set(new_sensors)
+    added = [sensor for sensor in new_sensors if sensor not in entities]
+    if removed:
+        entity_registry = async_get(hass)
+        for sensor in removed:
+            entity = entities.pop(sensor, None)
+            if entity is None:
+                continue
+            if entity.registry_entry is not None:
+                entity_registry.async_remove(entity.entity_id)
+            else:
+                hass.async_create_task(entity.async_remove())
 
-    entities = []
-    for sensor in configured_sensors:
-        new_entity = MypvDevice(coordinator, sensor, entry.title)
-        entities.append(new_entity)
-    _LOGGER.warning(f"Adding Entities: {entities}")
-    
-    async_add_entities(entities)
+    if publish_options_changed(old_options, new_options):
+        for sensor, entity in entities.items():
+            entity.publish_policy = publish_policy_for(sensor, new_options)
+
+    if added:
+        new_entities = {
+            sensor: MypvDevice(coordinator, sensor, entry.title, publish_policy_for(sensor, new_options))
+            for sensor in added
+        }
+        entities.update(new_entities)
+        entry_data[DATA_ADD_SENSORS](list(new_entities.values()))
+    _LOGGER.debug("Sensors of %s: %d added, %d removed", entry.title, len(added), len(removed))
 
 
 class MypvDevice(CoordinatorEntity):
     """Representation of a my-PV device."""
 
-    def __init__(self, coordinator, sensor_type, name):
+    def __init__(self, coordinator, sensor_type, name, publish_policy=None):
         """Initialize the sensor."""
         super().__init__(coordinator)
-        self._sensor = SENSOR_TYPES[sensor_type][0]
+        sensor_info = sensor_type_info(sensor_type)
+        self._sensor = sensor_info[0]
         self._name = name
         self.type = sensor_type
-        self._data_source = SENSOR_TYPES[sensor_type][3]
+        self._data_source = sensor_info[3]
         self.coordinator = coordinator
         self._last_value = None
-        self._unit_of_measurement = SENSOR_TYPES[self.type][1]
-        self._icon = SENSOR_TYPES[self.type][2]
+        self._unit_of_measurement = sensor_info[1]
+        self._icon = sensor_info[2]
         self.serial_number = self.coordinator.data["info"]["sn"]
         self.model = self.coordinator.data["info"]["device"]
+        self.publish_policy = publish_policy
+        # Static values and versions wait while the event loop is under load.
+        self.essential = self._data_source not in LOAD_DEFERRABLE_SOURCES and "version" not in sensor_type
+        self._freshness = None
         _LOGGER.debug(self.coordinator)
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if the publishing policy lets it through."""
+        freshness = (self.available, self._stale)
+        if freshness == self._freshness and not self.essential and self.coordinator.load_level >= LOAD_DEFER_LEVEL:
+            return
+        if (
+            freshness != self._freshness
+            or self.publish_policy is None
+            or self.publish_policy.should_publish(self.state, monotonic())
+        ):
+            self._freshness = freshness
+            self.async_write_ha_state()
+
+    @property
+    def _age(self):
+        return self.coordinator.age(self._data_source, self.type)
+
+    @property
+    def _stale(self) -> bool:
+        age = self._age
+        return age is not None and age > self.coordinator.options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER)
+
+    @property
+    def available(self) -> bool:
+        """Return False once the value is older than the unavailable limit."""
+        if not super().available:
+            return False
+        age = self._age
+        if age is None:
+            return self._last_value is not None
+        return age <= self.coordinator.options.get(CONF_UNAVAILABLE_AFTER, DEFAULT_UNAVAILABLE_AFTER)
+
+    @property
+    def extra_state_attributes(self):
+        """Mark values that were not refreshed recently."""
+        if self._stale:
+            return {"stale": True}
+        return None
+
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -85,29 +198,16 @@ class MypvDevice(CoordinatorEntity):
     def state(self):
         """Return the state of the device."""
         try:
-            state = self.coordinator.data[self._data_source][self.type]
-            
-            if self.type == "screen_mode_flag":
-                state = DEVICE_STATUS.get(self.hass.config.language, "en")[state]
-                    
-            if self.type == "power_act":
-                relOut = int(self.coordinator.data[self._data_source].get("rel1_out", None))
-                loadNom = int(self.coordinator.data[self._data_source].get("load_nom", None))
-                if relOut is not None and loadNom is not None:
-                    state = (relOut * loadNom) + int(state)
-            self._last_value = state
-        except Exception as ex:
-            _LOGGER.error(ex)
+            state = self.coordinator.data[self._data_source].get(self.type)
+        except (AttributeError, KeyError, TypeError):
+            state = None
+        if state is None:
             state = self._last_value
+        else:
+            self._last_value = state
         if state is None:
             return state
-        if self._unit_of_measurement == UnitOfFrequency.HERTZ:
-            return state / 1000
-        if self._unit_of_measurement == UnitOfTemperature.CELSIUS:
-            return state / 10
-        if self._unit_of_measurement == UnitOfElectricCurrent.AMPERE:
-            return state / 10
-        return state
+        return scale_value(self._unit_of_measurement, state)
 
     @property
     def unit_of_measurement(self):
@@ -132,4 +232,204 @@ class MypvDevice(CoordinatorEntity):
             "name": self._name,
             "manufacturer": "my-PV",
             "model": self.model,
-        }
\ No newline at end of file
+        }
+
+
+class FirmwareUpdateSensor(CoordinatorEntity):
+    """Progress of a firmware rollout for one my-PV device."""
+
+    def __init__(self, coordinator, name):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._name = name
+        self.serial_number = self.coordinator.data["info"]["sn"]
+        self.model = self.coordinator.data["info"]["device"]
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the rollout progress."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_FIRMWARE_ROLLOUT, self.async_write_ha_state)
+        )
+
+    @property
+    def _rollout(self):
+        rollout = self.hass.data[DOMAIN].get(DATA_FIRMWARE_ROLLOUT)
+        if rollout is None or self.serial_number not in rollout.status:
+            return None
+        return rollout
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._name} Firmware update"
+
+    @property
+    def state(self):
+        """Return the rollout status of the device."""
+        rollout = self._rollout
+        if rollout is None:
+            return "idle"
+        return rollout.status[self.serial_number]
+
+    @property
+    def extra_state_attributes(self):
+        """Return device and rollout progress."""
+        rollout = self._rollout
+        if rollout is None:
+            return None
+        return {
+            "progress": rollout.progress[self.serial_number],
+            "rollout_progress": rollout.total_progress,
+            "rollout_eta": rollout.eta,
+            "rollout_paused": rollout.paused,
+        }
+
+    @property
+    def icon(self):
+        """Return icon."""
+        return "mdi:update"
+
+    @property
+    def unique_id(self):
+        """Return unique id based on device serial."""
+        return "{} firmware_update".format(self.serial_number)
+
+    @property
+    def device_info(self):
+        """Return information about the device."""
+        return {
+            "identifiers": {(DOMAIN, self.serial_number)},
+            "name": self._name,
+            "manufacturer": "my-PV",
+            "model": self.model,
+        }
+
+
+class LoadLevelSensor(CoordinatorEntity):
+    """Degradation level the integration runs with on a busy event loop."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator, name):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._name = name
+        self.serial_number = self.coordinator.data["info"]["sn"]
+        self.model = self.coordinator.data["info"]["device"]
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the load level."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_LOAD_LEVEL, self._async_level_changed)
+        )
+
+    @callback
+    def _async_level_changed(self, level):
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write on a poll only after the priority option changed."""
+        state = self.hass.states.get(self.entity_id)
+        if state is None or state.attributes.get("priority") != self.coordinator.priority:
+            self.async_write_ha_state()
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._name} Load level"
+
+    @property
+    def state(self):
+        """Return the degradation level."""
+        return self.coordinator.load_level
+
+    @property
+    def extra_state_attributes(self):
+        """Return the priority and the effective poll interval."""
+        return {
+            "priority": self.coordinator.priority,
+            "update_interval": self.coordinator.update_interval.total_seconds(),
+        }
+
+    @property
+    def icon(self):
+        """Return icon."""
+        return "mdi:speedometer"
+
+    @property
+    def unique_id(self):
+        """Return unique id based on device serial."""
+        return "{} load_level".format(self.serial_number)
+
+    @property
+    def device_info(self):
+        """Return information about the device."""
+        return {
+            "identifiers": {(DOMAIN, self.serial_number)},
+            "name": self._name,
+            "manufacturer": "my-PV",
+            "model": self.model,
+        }
+
+
+class FleetSensor(Entity):
+    """Aggregate over all my-PV devices."""
+
+    _attr_should_poll = False
+
+    def __init__(self, fleet, key, name):
+        """Initialize the sensor."""
+        self._fleet = fleet
+        self._key = key
+        self._name = name
+        self._sensor, self._unit_of_measurement, self._icon = FLEET_SENSORS[key]
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the published totals."""
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_FLEET_UPDATE, self.async_write_ha_state)
+        )
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return f"{self._name} {self._sensor}"
+
+    @property
+    def state(self):
+        """Return the aggregated value."""
+        if self._key in self._fleet.totals:
+            value = self._fleet.totals[self._key]
+            return int(value) if self._unit_of_measurement is None else round(value, 1)
+        value = getattr(self._fleet, self._key)
+        if value is not None and self._unit_of_measurement == UnitOfTemperature.CELSIUS:
+            return value / 10
+        return value
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement this sensor expresses itself in."""
+        return self._unit_of_measurement
+
+    @property
+    def icon(self):
+        """Return icon."""
+        return self._icon
+
+    @property
+    def unique_id(self):
+        """Return unique id of the fleet value."""
+        return "fleet {}".format(self._key)
+
+    @property
+    def device_info(self):
+        """Return information about the fleet device."""
+        return {
+            "identifiers": {(DOMAIN, "fleet")},
+            "name": self._name,
+            "manufacturer": "my-PV",
+            "model": "Fleet",
+        }
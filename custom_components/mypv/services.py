@@ -0,0 +1,125 @@
+"""Services of the my-PV integration."""
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers import device_registry as dr
+
+from .const import (
+    DOMAIN,
+    DATA_COORDINATOR,
+    DATA_FIRMWARE_ROLLOUT,
+    DEFAULT_FIRMWARE_MAX_PARALLEL,
+    SERVICE_UPDATE_FIRMWARE,
+    SERVICE_APPLY_FLEET_COMMAND,
+    DEFAULT_FLEET_COMMAND_MAX_PARALLEL,
+    DEFAULT_FLEET_COMMAND_TIMEOUT,
+    FLEET_COMMAND_PARAMS,
+    WW1BOOST_MAX_VALUE,
+    WW1BOOST_MIN_VALUE,
+)
+from .command import async_apply_fleet_command, device_values
+from .firmware import FirmwareRollout
+
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_DEVICE_ID = "device_id"
+ATTR_MAX_PARALLEL = "max_parallel"
+ATTR_TIMEOUT = "timeout"
+
+UPDATE_FIRMWARE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_MAX_PARALLEL, default=DEFAULT_FIRMWARE_MAX_PARALLEL): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=20)
+        ),
+    }
+)
+
+APPLY_FLEET_COMMAND_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_DEVICE_ID): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional("devmode"): vol.All(vol.Coerce(int), vol.In([0, 1])),
+            vol.Optional("bststrt"): vol.All(vol.Coerce(int), vol.In([0, 1])),
+            vol.Optional("ww1boost"): vol.All(
+                vol.Coerce(float), vol.Range(min=WW1BOOST_MIN_VALUE, max=WW1BOOST_MAX_VALUE)
+            ),
+            vol.Optional(ATTR_MAX_PARALLEL, default=DEFAULT_FLEET_COMMAND_MAX_PARALLEL): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=100)
+            ),
+            vol.Optional(ATTR_TIMEOUT, default=DEFAULT_FLEET_COMMAND_TIMEOUT): vol.All(
+                vol.Coerce(float), vol.Range(min=0.1, max=60)
+            ),
+        }
+    ),
+    cv.has_at_least_one_key(*FLEET_COMMAND_PARAMS),
+)
+
+
+def selected_coordinators(hass: HomeAssistant, device_ids):
+    """Return the coordinators of the given devices, or of all devices."""
+    entry_ids = None
+    if device_ids:
+        registry = dr.async_get(hass)
+        entry_ids = set()
+        for device_id in device_ids:
+            device = registry.async_get(device_id)
+            if device is None:
+                raise HomeAssistantError(f"Unknown device {device_id}")
+            entry_ids.update(device.config_entries)
+
+    coordinators = []
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry_ids is not None and entry.entry_id not in entry_ids:
+            continue
+        entry_data = hass.data[DOMAIN].get(entry.entry_id)
+        if entry_data and DATA_COORDINATOR in entry_data:
+            coordinators.append(entry_data[DATA_COORDINATOR])
+    return coordinators
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the my-PV services."""
+
+    async def async_update_firmware(call: ServiceCall) -> None:
+        """Start a rolling firmware update."""
+        rollout = hass.data[DOMAIN].get(DATA_FIRMWARE_ROLLOUT)
+        if rollout is not None and rollout.running:
+            raise HomeAssistantError("A firmware rollout is already running")
+
+        coordinators = selected_coordinators(hass, call.data.get(ATTR_DEVICE_ID))
+        if not coordinators:
+            raise HomeAssistantError("No my-PV devices selected")
+
+        rollout = FirmwareRollout(hass, coordinators, call.data[ATTR_MAX_PARALLEL])
+        hass.data[DOMAIN][DATA_FIRMWARE_ROLLOUT] = rollout
+        hass.async_create_background_task(rollout.async_run(), "mypv firmware rollout")
+
+    async def async_apply_command(call: ServiceCall) -> dict:
+        """Set parameters on many devices at once."""
+        coordinators = selected_coordinators(hass, call.data.get(ATTR_DEVICE_ID))
+        if not coordinators:
+            raise HomeAssistantError("No my-PV devices selected")
+
+        return await async_apply_fleet_command(
+            hass,
+            coordinators,
+            device_values(call.data),
+            call.data[ATTR_MAX_PARALLEL],
+            call.data[ATTR_TIMEOUT],
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_UPDATE_FIRMWARE, async_update_firmware, schema=UPDATE_FIRMWARE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_APPLY_FLEET_COMMAND,
+        async_apply_command,
+        schema=APPLY_FLEET_COMMAND_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
@@ -0,0 +1,194 @@
+"""Hourly long-term statistics of high-rate my-PV metrics."""
+from collections import deque
+import logging
+
+from homeassistant.const import UnitOfEnergy, UnitOfPower
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util, slugify
+
+from .const import (
+    DOMAIN,
+    STATISTICS_MAX_GAP,
+    STATISTICS_MAX_PENDING,
+    scale_value,
+    sensor_type_info,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StatisticsPeriod:
+    """Mean, min, max and time integral of one metric within one hour.
+
+    The integral is in value hours, Wh for a power metric. Gaps longer
+    than STATISTICS_MAX_GAP between two values do not count.
+    """
+
+    __slots__ = ("start", "count", "total", "min", "max", "integral", "_last", "_last_time")
+
+    def __init__(self, start, value, now):
+        """Start the period with its first value."""
+        self.start = start
+        self.count = 1
+        self.total = value
+        self.min = value
+        self.max = value
+        self.integral = 0.0
+        self._last = value
+        self._last_time = now
+
+    def add(self, value, now):
+        """Add a value received at a POSIX timestamp to the period."""
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        elapsed = now - self._last_time
+        if 0 < elapsed <= STATISTICS_MAX_GAP:
+            self.integral += (self._last + value) * elapsed / 7200
+        self._last = value
+        self._last_time = now
+
+    def as_statistic(self):
+        """Return the period as recorder statistic data."""
+        return {
+            "start": self.start,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class StatisticsImporter:
+    """Accumulate metrics per hour and import finished hours into the recorder.
+
+    Only completed hours are imported, the running hour lives in memory and
+    is lost on restart. Hours that cannot be imported yet because the
+    recorder is not loaded are kept up to a bounded backlog.
+
+    Power metrics get a second statistic with the energy as sum. The sum
+    is cumulative, it continues from the last sum in the recorder.
+    """
+
+    def __init__(self, hass: HomeAssistant, keys):
+        """Initialize the importer."""
+        self.hass = hass
+        self.keys = list(keys)
+        self._periods = {}
+        self._pending = {key: deque(maxlen=STATISTICS_MAX_PENDING) for key in self.keys}
+        self._energy_keys = [key for key in self.keys if sensor_type_info(key)[1] == UnitOfPower.WATT]
+        self._pending_energy = {key: deque(maxlen=STATISTICS_MAX_PENDING) for key in self._energy_keys}
+        self._energy_sums = dict.fromkeys(self._energy_keys)
+        self._loading = None
+
+    @property
+    def pending(self) -> int:
+        """Return the number of finished hours waiting for the recorder."""
+        return sum(len(statistics) for statistics in self._pending.values()) + sum(
+            len(energies) for energies in self._pending_energy.values()
+        )
+
+    def as_dict(self):
+        """Return the resource counters of the importer."""
+        return {"metrics": len(self._periods), "pending": self.pending}
+
+    @callback
+    def async_add(self, serial, values):
+        """Add the values of one poll."""
+        now = dt_util.utcnow()
+        start = now.replace(minute=0, second=0, microsecond=0)
+        timestamp = now.timestamp()
+        finished = False
+        for key in self.keys:
+            value = values.get(key)
+            if value is None:
+                continue
+            try:
+                value = scale_value(sensor_type_info(key)[1], float(value))
+            except (TypeError, ValueError):
+                continue
+            period = self._periods.get(key)
+            if period is not None and period.start == start:
+                period.add(value, timestamp)
+                continue
+            if period is not None:
+                self._pending[key].append(period.as_statistic())
+                if key in self._pending_energy:
+                    self._pending_energy[key].append((period.start, period.integral))
+                finished = True
+            self._periods[key] = StatisticsPeriod(start, value, timestamp)
+        if finished:
+            self._async_import(serial)
+
+    @callback
+    def _async_import(self, serial):
+        """Import the finished hours, one batch per metric."""
+        if "recorder" not in self.hass.config.components:
+            _LOGGER.debug("Recorder not loaded, keeping %d statistics of %s", self.pending, serial)
+            return
+        from homeassistant.components.recorder.statistics import async_add_external_statistics
+
+        for key, statistics in self._pending.items():
+            if not statistics:
+                continue
+            sensor_info = sensor_type_info(key)
+            metadata = {
+                "has_mean": True,
+                "has_sum": False,
+                "name": f"{serial} {sensor_info[0]}",
+                "source": DOMAIN,
+                "statistic_id": self._statistic_id(serial, key),
+                "unit_of_measurement": sensor_info[1],
+            }
+            async_add_external_statistics(self.hass, metadata, list(statistics))
+            statistics.clear()
+
+        for key, energies in self._pending_energy.items():
+            if not energies:
+                continue
+            if self._energy_sums[key] is None:
+                if self._loading is None:
+                    self._loading = self.hass.async_create_background_task(
+                        self._async_load_sums(serial), "mypv statistics sums"
+                    )
+                continue
+            statistics = []
+            for start, energy in energies:
+                self._energy_sums[key] += energy
+                statistics.append({"start": start, "sum": self._energy_sums[key]})
+            metadata = {
+                "has_mean": False,
+                "has_sum": True,
+                "name": f"{serial} {sensor_type_info(key)[0]} energy",
+                "source": DOMAIN,
+                "statistic_id": self._statistic_id(serial, key, "energy"),
+                "unit_of_measurement": UnitOfEnergy.WATT_HOUR,
+            }
+            async_add_external_statistics(self.hass, metadata, statistics)
+            energies.clear()
+
+    @staticmethod
+    def _statistic_id(serial, key, suffix=None):
+        object_id = f"{slugify(serial)}_{key}"
+        return f"{DOMAIN}:{object_id}_{suffix}" if suffix else f"{DOMAIN}:{object_id}"
+
+    async def _async_load_sums(self, serial):
+        """Continue the energy sums from the last imported hour."""
+        from homeassistant.components.recorder import get_instance
+        from homeassistant.components.recorder.statistics import get_last_statistics
+
+        try:
+            for key, energy_sum in self._energy_sums.items():
+                if energy_sum is not None:
+                    continue
+                statistic_id = self._statistic_id(serial, key, "energy")
+                last = await get_instance(self.hass).async_add_executor_job(
+                    get_last_statistics, self.hass, 1, statistic_id, False, {"sum"}
+                )
+                rows = last.get(statistic_id)
+                self._energy_sums[key] = (rows[0]["sum"] or 0.0) if rows else 0.0
+        finally:
+            self._loading = None
+        self._async_import(serial)
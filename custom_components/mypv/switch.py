@@ -9,8 +9,9 @@ from homeassistant.const import CONF_HOST
 from .const import DOMAIN, DATA_COORDINATOR
 from .coordinator import MYPVDataUpdateCoordinator
 
+import asyncio
 import logging
-import aiohttp
+from aiohttp import ClientError
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -18,8 +19,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
     """Set up the toggle switch."""
     coordinator: MYPVDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR]
     host = entry.data[CONF_HOST]
-    _LOGGER.warning("Adding toggle switch")
-    async_add_entities([ToggleSwitch(coordinator, host, entry.title)], True)
+    async_add_entities([ToggleSwitch(coordinator, host, entry.title)])
 
 class ToggleSwitch(CoordinatorEntity, SwitchEntity):
     def __init__(self, coordinator, host, name):
@@ -30,17 +30,21 @@ class ToggleSwitch(CoordinatorEntity, SwitchEntity):
         self._host = host
         self._switch = f"device_state_{self._host}"
         self._icon = "mdi:power"
-        self._is_on = self.coordinator.data["setup"]["devmode"] if self.coordinator.data else False
+        self._is_on = self.coordinator.data["setup"].get("devmode") if self.coordinator.data else False
         self._model = self.coordinator.data["info"]["device"]
         self.serial_number = self.coordinator.data["info"]["sn"]
     
     @property
     def is_on(self):
-        _LOGGER.warning(f"CHeck is_on: {self.coordinator.data["setup"]["devmode"]}")
-        if self.coordinator.data:
+        if self.coordinator.data and "devmode" in self.coordinator.data["setup"]:
             self._is_on = self.coordinator.data["setup"]["devmode"]
         return self._is_on
 
+    @property
+    def available(self) -> bool:
+        """Return False once devmode is older than the unavailable limit."""
+        return super().available and not self.coordinator.expired("setup", "devmode")
+
     @property
     def name(self):
         return self._name
@@ -65,21 +69,19 @@ class ToggleSwitch(CoordinatorEntity, SwitchEntity):
         return "{} {}".format(self.serial_number, self._switch)
     
     async def async_turn_on(self):
-        _LOGGER.warning("switch turned on")
         await self.async_toggle_switch(1)
         self._is_on = True
         await self.coordinator.async_refresh()
         self.async_write_ha_state()
 
     async def async_turn_off(self):
-        _LOGGER.warning("Switch turned off")
         await self.async_toggle_switch(0)
         self._is_on = False
         await self.coordinator.async_refresh()
         self.async_write_ha_state()
     
     async def async_toggle_switch(self, mode):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://{self._host}/data.jsn?devmode={mode}") as response:
-                if response.status != 200:
-                    _LOGGER.error(f"Failed to turn on/off the device {self.unique_id}")
\ No newline at end of file
+        try:
+            await self.coordinator.scheduler.async_write({"devmode": mode})
+        except (ClientError, asyncio.TimeoutError):
+            _LOGGER.error(f"Failed to turn on/off the device {self.unique_id}")
\ No newline at end of file
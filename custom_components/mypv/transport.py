@@ -0,0 +1,179 @@
+"""Keep-alive HTTP transport for the embedded web server of my-PV devices."""
+import asyncio
+import logging
+
+from aiohttp import ClientConnectionError, ClientPayloadError, ClientResponseError, RequestInfo
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .const import MAX_CACHED_REQUESTS, MAX_RESPONSE_HEAD_SIZE, MAX_RESPONSE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _split_host(host):
+    """Return address and port of a host with an optional port."""
+    address, _, port = host.rpartition(":")
+    if address and port.isdigit():
+        return address, int(port)
+    return host, 80
+
+
+class DeviceConnection:
+    """One persistent HTTP/1.1 connection to a device.
+
+    The devices only answer a few fixed GET requests, so the encoded
+    requests are cached and the response is parsed just far enough to find
+    the body. Responses larger than MAX_RESPONSE_SIZE are refused. A request
+    on a connection the device closed in the meantime is retried once on a
+    new connection. Errors are raised as aiohttp client errors so callers
+    handle them like session requests.
+    """
+
+    def __init__(self, host, max_response_size=MAX_RESPONSE_SIZE):
+        """Initialize the connection, it is opened on the first request."""
+        self.host = host
+        self._address, self._port = _split_host(host)
+        self._max_response_size = max_response_size
+        self._request_tail = (
+            f" HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode("ascii")
+        )
+        self._requests = {}
+        self._buffer = bytearray()
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self.connects = 0
+
+    @property
+    def connected(self) -> bool:
+        """Return True while a connection is open."""
+        return self._writer is not None
+
+    def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    def _request(self, path):
+        request = self._requests.get(path)
+        if request is None:
+            if len(self._requests) >= MAX_CACHED_REQUESTS:
+                self._requests.pop(next(iter(self._requests)))
+            request = self._requests[path] = b"GET /" + path.encode("ascii") + self._request_tail
+        return request
+
+    async def async_get(self, path, timeout) -> bytes:
+        """Send a GET request and return the response body."""
+        request = self._request(path)
+        async with self._lock:
+            try:
+                async with asyncio.timeout(timeout):
+                    return await self._async_exchange(request)
+            except ValueError as error:
+                self.close()
+                raise ClientPayloadError(f"Malformed response from {self.host}") from error
+            except BaseException:
+                # The state of the connection is unknown after any error.
+                self.close()
+                raise
+
+    async def _async_exchange(self, request):
+        reused = self._writer is not None
+        if not reused:
+            await self._async_connect()
+        try:
+            return await self._async_send(request)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            if not reused:
+                raise ClientConnectionError(f"{self.host}: {error!r}") from error
+            # The device dropped the idle connection, reconnect once.
+            _LOGGER.debug("Connection to %s was closed by the device, reconnecting", self.host)
+            self.close()
+        await self._async_connect()
+        try:
+            return await self._async_send(request)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            raise ClientConnectionError(f"{self.host}: {error!r}") from error
+
+    async def _async_connect(self):
+        try:
+            self._reader, self._writer = await asyncio.open_connection(
+                self._address, self._port, limit=MAX_RESPONSE_HEAD_SIZE
+            )
+        except OSError as error:
+            raise ClientConnectionError(f"Cannot connect to {self.host}: {error}") from error
+        self.connects += 1
+
+    async def _async_send(self, request):
+        self._writer.write(request)
+        await self._writer.drain()
+        try:
+            head = await self._reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError as error:
+            raise ClientPayloadError(f"Response head of {self.host} too large") from error
+
+        lines = head.split(b"\r\n")
+        version, status, *reason = lines[0].split(b" ", 2)
+        status = int(status)
+        length = None
+        chunked = False
+        keep_alive = version == b"HTTP/1.1"
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            elif name == b"connection":
+                keep_alive = value.strip().lower() == b"keep-alive"
+
+        if chunked:
+            body = await self._async_read_chunked()
+        elif length is not None:
+            if length > self._max_response_size:
+                raise ClientPayloadError(f"Response of {self.host} too large: {length} bytes")
+            body = await self._reader.readexactly(length)
+        else:
+            body = await self._async_read_to_end()
+            keep_alive = False
+
+        if not keep_alive:
+            self.close()
+        if status >= 400:
+            raise ClientResponseError(
+                self._request_info(request),
+                (),
+                status=status,
+                message=b"".join(reason).decode("latin-1"),
+            )
+        return body
+
+    def _request_info(self, request):
+        """Return the request info of an encoded request for error messages."""
+        url = URL(f"http://{self.host}{request.split(b' ', 2)[1].decode('ascii')}")
+        return RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()), url)
+
+    async def _async_read_chunked(self):
+        buffer = self._buffer
+        buffer.clear()
+        while True:
+            size = int((await self._reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            if len(buffer) + size > self._max_response_size:
+                raise ClientPayloadError(f"Response of {self.host} too large")
+            if size == 0:
+                await self._reader.readuntil(b"\r\n")
+                return bytes(buffer)
+            buffer += await self._reader.readexactly(size)
+            await self._reader.readexactly(2)
+
+    async def _async_read_to_end(self):
+        buffer = self._buffer
+        buffer.clear()
+        while chunk := await self._reader.read(MAX_RESPONSE_HEAD_SIZE):
+            buffer += chunk
+            if len(buffer) > self._max_response_size:
+                raise ClientPayloadError(f"Response of {self.host} too large")
+        return bytes(buffer)
@@ -0,0 +1,89 @@
+"""Measure import time and entry setup time of the integration.
+
+Import time is taken with python -X importtime in a fresh interpreter,
+split into the modules of the integration and everything they pull in.
+Setup time is the time from adding a config entry until it is loaded,
+against emulated devices, once with setup.jsn answering and once with
+setup.jsn unreachable on the first poll. The platforms set up for every
+entry are printed as well.
+
+    python scripts/bench_setup.py --devices 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DOMAIN, ROOT, async_add_device, async_start_hass, async_stop_hass  # noqa: E402
+from emulator import DeviceEmulator  # noqa: E402
+
+PACKAGE = f"custom_components.{DOMAIN}"
+
+
+def import_times(module):
+    """Return self and cumulative import time in ms per module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    return times
+
+
+def report_imports(modules):
+    print("import time [ms]          self  cumulative")
+    for module in modules:
+        times = import_times(module)
+        package = {name: value for name, value in times.items() if name.startswith(PACKAGE)}
+        own = sum(value[0] for value in package.values())
+        total = times[module][1]
+        print(f"{module:<40} {own:8.1f} {total:10.1f}")
+
+
+async def report_setup(devices, setup_reachable):
+    emulator = DeviceEmulator(devices)
+    for device in emulator.devices:
+        if not setup_reachable:
+            device.unreachable.add("setup.jsn")
+    await emulator.async_start()
+    hass = await async_start_hass()
+    durations = []
+    platforms = set()
+    for host in emulator.hosts:
+        started = perf_counter()
+        entry = await async_add_device(hass, host)
+        durations.append(perf_counter() - started)
+        platforms.add(tuple(hass.data[DOMAIN][entry.entry_id]["platforms"]))
+    label = "reachable" if setup_reachable else "unreachable"
+    print(
+        f"setup.jsn {label:<12} entries {devices:3d}  "
+        f"median {statistics.median(durations) * 1000:7.1f} ms  "
+        f"max {max(durations) * 1000:7.1f} ms  platforms {sorted(platforms)}"
+    )
+    await async_stop_hass(hass)
+    await emulator.async_stop()
+
+
+async def _main(args):
+    report_imports([PACKAGE, f"{PACKAGE}.sensor", f"{PACKAGE}.config_flow"])
+    await report_setup(args.devices, True)
+    await report_setup(args.devices, False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=10)
+    asyncio.run(_main(parser.parse_args()))
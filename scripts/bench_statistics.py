@@ -0,0 +1,178 @@
+"""Compare recorder database growth with and without the statistics option.
+
+Runs the integration with a SQLite recorder against emulated devices and
+polls them for a simulated period as fast as possible. The clocks of the
+publishing policies and of the hourly statistics are advanced by the poll
+interval on every poll, so hours of polling take seconds. For both modes
+the script reports the rows of the states and statistics tables, the
+growth of the database file after a WAL checkpoint and the bytes the
+process wrote to disk while polling.
+
+    python scripts/bench_statistics.py --devices 2 --hours 6
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (  # noqa: E402
+    DOMAIN,
+    async_add_device,
+    async_start_hass,
+    async_stop_hass,
+    config_dir,
+)
+from emulator import DeviceEmulator  # noqa: E402
+from homeassistant.helpers import recorder as recorder_helper  # noqa: E402
+from homeassistant.setup import async_setup_component  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+
+POLL_INTERVAL = 10
+STATISTICS_KEYS = ["power", "power_act", "m0sum", "volt_mains", "freq", "temp1"]
+MONITORED_CONDITIONS = STATISTICS_KEYS + ["temp_ps", "fan_speed"]
+
+
+class SimulatedClock:
+    """Monotonic and wall clock advanced by hand."""
+
+    def __init__(self, start):
+        """Initialize the clock at a wall clock time."""
+        self.offset = 0.0
+        self.start = start
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+    def monotonic(self):
+        return self.offset
+
+    def utcnow(self):
+        return self.start + timedelta(seconds=self.offset)
+
+
+class _DtUtil:
+    """dt_util replacement with a simulated utcnow."""
+
+    def __init__(self, clock):
+        self.utcnow = clock.utcnow
+
+    def __getattr__(self, name):
+        return getattr(dt_util, name)
+
+
+def written_bytes():
+    """Return the bytes this process caused to be written to storage."""
+    try:
+        with open("/proc/self/io") as io:
+            for line in io:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def async_database_size(recorder, path):
+    """Return the size of the database after a WAL checkpoint."""
+
+    def checkpoint():
+        from sqlalchemy import text
+
+        with recorder.engine.connect() as connection:
+            connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    await recorder.async_add_executor_job(checkpoint)
+    return os.path.getsize(path)
+
+
+async def run(args, statistics):
+    path = config_dir()
+    database = os.path.join(path, "home-assistant_v2.db")
+    emulator = DeviceEmulator(args.devices)
+    await emulator.async_start()
+    hass = await async_start_hass(path)
+    recorder_helper.async_initialize_recorder(hass)
+    assert await async_setup_component(
+        hass, "recorder", {"recorder": {"db_url": f"sqlite:///{database}", "commit_interval": 1}}
+    )
+    from homeassistant.components.recorder import get_instance
+
+    from custom_components.mypv import sensor, statistics as statistics_module
+    from custom_components.mypv.const import DATA_COORDINATOR
+
+    start = dt_util.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=args.hours)
+    clock = SimulatedClock(start)
+    sensor.monotonic = clock.monotonic
+    statistics_module.dt_util = _DtUtil(clock)
+
+    options = {"statistics": STATISTICS_KEYS} if statistics else {}
+    coordinators = []
+    for host in emulator.hosts:
+        entry = await async_add_device(hass, host, MONITORED_CONDITIONS, options)
+        coordinators.append(hass.data[DOMAIN][entry.entry_id][DATA_COORDINATOR])
+    recorder = get_instance(hass)
+    await recorder.async_block_till_done()
+
+    size_before = await async_database_size(recorder, database)
+    written_before = written_bytes()
+    started = perf_counter()
+    polls = args.hours * 3600 // POLL_INTERVAL
+    for _ in range(polls):
+        clock.advance(POLL_INTERVAL)
+        await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+        await hass.async_block_till_done()
+    # One more poll in the next hour flushes the last finished hour.
+    clock.advance(3600)
+    await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+    await hass.async_block_till_done()
+    await recorder.async_block_till_done()
+    duration = perf_counter() - started
+
+    def count_rows():
+        from sqlalchemy import text
+
+        with recorder.engine.connect() as connection:
+            return {
+                table: connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                for table in ("states", "statistics", "statistics_short_term")
+            }
+
+    rows = await recorder.async_add_executor_job(count_rows)
+    written_after = written_bytes()
+    size_after = await async_database_size(recorder, database)
+    result = {
+        "rows": rows,
+        "db_growth_kib": round((size_after - size_before) / 1024),
+        "written_kib": (
+            round((written_after - written_before) / 1024) if written_before is not None else None
+        ),
+        "polls": polls * len(coordinators),
+        "duration_s": round(duration, 1),
+    }
+    await async_stop_hass(hass)
+    await emulator.async_stop()
+    return result
+
+
+async def _main(args):
+    results = {}
+    for statistics in (False, True):
+        results[statistics] = await run(args, statistics)
+    for statistics, result in results.items():
+        mode = "statistics" if statistics else "states"
+        print(f"{mode:<10} {result}")
+    states = {mode: results[mode]["rows"]["states"] for mode in results}
+    assert states[True] < states[False], states
+    assert results[True]["rows"]["statistics"] > 0, results[True]
+    assert results[True]["db_growth_kib"] < results[False]["db_growth_kib"], results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--hours", type=int, default=6)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Compare the kept-alive device connection with an aiohttp session.
+
+The emulated device runs in a child process, so the CPU time measured here
+is the client side only: sending the request, parsing the response and
+decoding the JSON of data.jsn. The device answers with about 150 keys like
+a real AC-THOR. Finally an HTTP error of the device is checked to surface
+as a ClientResponseError that formats.
+
+    python scripts/bench_transport.py --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from time import perf_counter, process_time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ROOT  # noqa: E402
+import emulator  # noqa: E402
+
+sys.path.insert(0, ROOT)
+
+import aiohttp  # noqa: E402
+
+from custom_components.mypv.transport import DeviceConnection  # noqa: E402
+
+PATH = "data.jsn"
+TIMEOUT = 5
+
+
+async def measure(name, fetch, requests):
+    for _ in range(min(50, requests)):
+        await fetch()
+    cpu = process_time()
+    wall = perf_counter()
+    for _ in range(requests):
+        data = await fetch()
+    cpu = process_time() - cpu
+    wall = perf_counter() - wall
+    print(
+        f"{name:<28} {cpu / requests * 1e6:7.1f} us CPU {wall / requests * 1e6:7.1f} us wall"
+        f"  per request, {len(data)} keys"
+    )
+    return cpu / requests
+
+
+async def _main(args):
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    device = context.Process(
+        target=emulator.serve, args=(1, {"extra_keys": args.keys}, child), daemon=True
+    )
+    device.start()
+    (host,) = parent.recv()
+
+    connection = DeviceConnection(host)
+
+    async def fetch_connection():
+        return json.loads(await connection.async_get(PATH, TIMEOUT))
+
+    async with aiohttp.ClientSession() as session:
+
+        async def fetch_session():
+            async with session.get(
+                f"http://{host}/{PATH}", timeout=aiohttp.ClientTimeout(total=TIMEOUT)
+            ) as response:
+                return json.loads(await response.read())
+
+        lean = await measure("DeviceConnection", fetch_connection, args.requests)
+        pooled = await measure("aiohttp ClientSession", fetch_session, args.requests)
+    print(f"DeviceConnection needs {lean / pooled:.0%} of the CPU time of the session")
+    print(f"connects: {connection.connects}")
+
+    try:
+        await connection.async_get("missing.jsn", TIMEOUT)
+    except aiohttp.ClientResponseError as error:
+        print(f"HTTP error: {error}")
+        assert error.status == 404, error
+    else:
+        raise AssertionError("missing.jsn did not fail")
+    connection.close()
+    device.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=120, help="keys added to the emulated data.jsn")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,274 @@
+"""Local emulator of my-PV AC-THOR devices.
+
+Every emulated device listens on its own port of 127.0.0.1 and answers
+data.jsn, setup.jsn and mypv_dev.jsn over HTTP/1.1 with keep-alive like the
+embedded web server of the devices. data.jsn?<param>=<value> writes change
+the setup, upd=1 starts a simulated firmware update.
+
+Faults can be injected per device with probabilities per request:
+dropped connections (flapping), requests that never get an answer
+(timeouts), malformed JSON and HTTP errors.
+
+Run it standalone to poke at it with a browser or curl:
+
+    python scripts/emulator.py --devices 3
+"""
+import argparse
+import asyncio
+from http import HTTPStatus
+import json
+import random
+from urllib.parse import parse_qsl
+
+# Update state codes reported in upd_state while a firmware update runs.
+UPDATE_RUNNING = 2
+UPDATE_IDLE = 0
+
+
+class EmulatedDevice:
+    """State and fault injection of one emulated device."""
+
+    def __init__(
+        self,
+        serial,
+        *,
+        flap=0.0,
+        timeout=0.0,
+        malformed=0.0,
+        http_error=0.0,
+        update_files=5,
+        update_error=None,
+        update_reboot=1,
+        extra_keys=0,
+        seed=None,
+    ):
+        """Initialize the device."""
+        self.serial = serial
+        self.flap = flap
+        self.timeout = timeout
+        self.malformed = malformed
+        self.http_error = http_error
+        self.update_files = update_files
+        self.update_error = update_error
+        self.update_reboot = update_reboot
+        # Endpoints that drop every request, e.g. {"setup.jsn"}
+        self.unreachable = set()
+        self.random = random.Random(seed if seed is not None else serial)
+        self.requests = {}
+        self.connections = 0
+        self.writers = set()
+        self.server = None
+        self.port = None
+        self._rebooting = 0
+        self.data = {
+            "device": "AC-THOR",
+            "fwversion": "a0020700",
+            "fwversionlatest": "a0020800",
+            "psversion": "104",
+            "psversionlatest": "104",
+            "power_act": 0,
+            "power": 1500,
+            "load_nom": 3000,
+            "rel1_out": 0,
+            "temp1": 450,
+            "temp_ps": 350,
+            "fan_speed": 30,
+            "freq": 50000,
+            "volt_mains": 230,
+            "curr_mains": 20,
+            "curr_L2": 21,
+            "curr_L3": 19,
+            "power1_solar": 500,
+            "power2_solar": 400,
+            "power3_solar": 300,
+            "power_solar_act": 1200,
+            "power_grid_act": 300,
+            "m0sum": 1200,
+            "screen_mode_flag": 1,
+            "boostactive": 0,
+            "error_state": 0,
+            "upd_state": UPDATE_IDLE,
+            "upd_files_left": 0,
+            "ps_upd_state": 0,
+            "p9s_upd_state": 0,
+        }
+        # Unknown keys, real devices answer with about 150 keys
+        self.data.update({f"extra{index}": index for index in range(extra_keys)})
+        self.setup = {"devmode": 1, "ww1boost": 500, "mainmode": 1}
+        self.info = {"sn": serial, "device": "AC-THOR", "fwversion": self.data["fwversion"]}
+
+    @property
+    def host(self):
+        """Return host:port of the device."""
+        return f"127.0.0.1:{self.port}"
+
+    def _step(self):
+        """Let the measured values wander a little."""
+        rnd = self.random
+        data = self.data
+        data["power_act"] = max(0, data["power_act"] + rnd.randint(-50, 50))
+        data["power"] = max(0, data["power"] + rnd.randint(-40, 40))
+        data["temp1"] += rnd.randint(-2, 2)
+        data["temp_ps"] += rnd.randint(-1, 1)
+        data["freq"] = 50000 + rnd.randint(-20, 20)
+        data["volt_mains"] = 230 + rnd.randint(-2, 2)
+        data["power_solar_act"] = max(0, data["power_solar_act"] + rnd.randint(-30, 30))
+
+    def _advance_update(self):
+        data = self.data
+        if data["upd_state"] != UPDATE_RUNNING:
+            return
+        if data["upd_files_left"] > 0:
+            data["upd_files_left"] -= 1
+            return
+        if self.update_error is not None:
+            data["upd_state"] = self.update_error
+            return
+        data["upd_state"] = UPDATE_IDLE
+        data["fwversion"] = data["fwversionlatest"]
+        self.info["fwversion"] = data["fwversion"]
+        self._rebooting = self.update_reboot
+
+    def write(self, params):
+        """Apply a data.jsn write."""
+        for key, value in params.items():
+            if key == "upd":
+                self.data["upd_state"] = UPDATE_RUNNING
+                self.data["upd_files_left"] = self.update_files
+            elif key == "bststrt":
+                self.data["boostactive"] = int(value)
+            else:
+                self.setup[key] = int(float(value))
+
+    def respond(self, path):
+        """Return status and body for a request path, None to drop it."""
+        name, _, query = path.lstrip("/").partition("?")
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if self._rebooting:
+            self._rebooting -= 1
+            return None
+        rnd = self.random
+        if name in self.unreachable or rnd.random() < self.flap:
+            return None
+        if rnd.random() < self.http_error:
+            return 500, b"Internal Server Error"
+        if name == "data.jsn" and query:
+            self.write(dict(parse_qsl(query)))
+            return 200, b""
+        if name == "data.jsn":
+            self._step()
+            self._advance_update()
+            document = self.data
+        elif name == "setup.jsn":
+            document = self.setup
+        elif name == "mypv_dev.jsn":
+            document = self.info
+        else:
+            return 404, b"Not Found"
+        body = json.dumps(document).encode()
+        if rnd.random() < self.malformed:
+            body = body[: len(body) // 2]
+        return 200, body
+
+    async def handle(self, reader, writer):
+        """Serve one client connection."""
+        self.connections += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ", 2)[1].decode()
+                if self.random.random() < self.timeout:
+                    # Never answer, wait until the client gives up.
+                    await reader.read()
+                    break
+                response = self.respond(path)
+                if response is None:
+                    break
+                status, body = response
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s"
+                    % (status, HTTPStatus(status).phrase.encode(), len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class DeviceEmulator:
+    """A set of emulated devices, one listening socket per device."""
+
+    def __init__(self, count, **faults):
+        """Initialize the devices, faults apply to every device."""
+        self.devices = [EmulatedDevice(f"{1000000 + index}", **faults) for index in range(count)]
+
+    @property
+    def hosts(self):
+        """Return host:port of every device."""
+        return [device.host for device in self.devices]
+
+    def by_host(self, host):
+        """Return the device listening on a host."""
+        return next(device for device in self.devices if device.host == host)
+
+    async def async_start(self):
+        """Start listening."""
+        for device in self.devices:
+            device.server = await asyncio.start_server(device.handle, "127.0.0.1", 0)
+            device.port = device.server.sockets[0].getsockname()[1]
+
+    async def async_stop(self):
+        """Stop listening and drop all connections."""
+        for device in self.devices:
+            device.server.close()
+            for writer in list(device.writers):
+                writer.close()
+        for device in self.devices:
+            await device.server.wait_closed()
+
+
+async def _async_serve(count, faults, connection):
+    emulator = DeviceEmulator(count, **faults)
+    await emulator.async_start()
+    connection.send(emulator.hosts)
+    await asyncio.Event().wait()
+
+
+def serve(count, faults, connection):
+    """Run devices until the process is terminated, send their hosts first.
+
+    Target of a multiprocessing.Process, so the emulator does not share the
+    event loop, sockets and memory of the process under test.
+    """
+    asyncio.run(_async_serve(count, faults, connection))
+
+
+async def _main(args):
+    emulator = DeviceEmulator(
+        args.devices,
+        flap=args.flap,
+        timeout=args.timeout,
+        malformed=args.malformed,
+        http_error=args.http_error,
+    )
+    await emulator.async_start()
+    for host in emulator.hosts:
+        print(f"http://{host}/data.jsn")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--flap", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=0.0)
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--http-error", type=float, default=0.0)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,81 @@
+"""Run a rolling firmware update against emulated devices.
+
+Every device walks through the update states of the emulator: upd_state
+goes to a running code while upd_files_left counts down, afterwards the
+device reboots (drops requests) and reports the new version. With
+--fail-device the given device ends its update with an error code, the
+rollout has to mark it failed and pause.
+
+The script prints the rollout status and how many data.jsn, setup.jsn and
+mypv_dev.jsn requests every device answered while it was followed.
+
+    python scripts/firmware_rollout.py --devices 4 --fail-device 1
+"""
+import argparse
+import asyncio
+import os
+import sys
+from time import monotonic
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DOMAIN, async_add_device, async_start_hass, async_stop_hass  # noqa: E402
+from emulator import DeviceEmulator  # noqa: E402
+
+# Device reported error code of the emulated failing update
+UPDATE_ERROR = 20
+
+
+async def _main(args):
+    emulator = DeviceEmulator(args.devices, update_files=args.files)
+    if args.fail_device is not None:
+        emulator.devices[args.fail_device].update_error = UPDATE_ERROR
+    await emulator.async_start()
+    hass = await async_start_hass()
+    # Loaded by Home Assistant from the configuration directory.
+    from custom_components.mypv import firmware
+    from custom_components.mypv.const import DATA_FIRMWARE_ROLLOUT
+
+    firmware.FIRMWARE_UPDATE_POLL_INTERVAL = args.poll_interval
+    for host in emulator.hosts:
+        await async_add_device(hass, host)
+    for device in emulator.devices:
+        device.requests.clear()
+
+    started = monotonic()
+    await hass.services.async_call(
+        DOMAIN, "update_firmware", {"max_parallel": args.max_parallel}, blocking=True
+    )
+    rollout = hass.data[DOMAIN][DATA_FIRMWARE_ROLLOUT]
+    while rollout.running:
+        await asyncio.sleep(0.1)
+    duration = monotonic() - started
+
+    print(f"rollout finished in {duration:.1f} s: {rollout.as_dict()}")
+    for device in emulator.devices:
+        print(
+            device.serial,
+            device.data["fwversion"],
+            f"upd_state={device.data['upd_state']}",
+            dict(sorted(device.requests.items())),
+        )
+
+    statuses = rollout.status
+    if args.fail_device is None:
+        assert all(status == firmware.STATUS_DONE for status in statuses.values()), statuses
+    else:
+        failed = emulator.devices[args.fail_device].serial
+        assert statuses[failed] == firmware.STATUS_FAILED, statuses
+        assert rollout.paused
+    await async_stop_hass(hass)
+    await emulator.async_stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--max-parallel", type=int, default=2)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--fail-device", type=int)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""Run Home Assistant with the my-PV integration against emulated devices.
+
+Used by the benchmark and soak scripts in this directory. A throw-away
+configuration directory gets the integration linked into custom_components,
+Home Assistant is started without any other integration and one config
+entry is added per emulated device.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from homeassistant import bootstrap, config_entries, core, loader  # noqa: E402
+from homeassistant.config_entries import ConfigEntry  # noqa: E402
+from homeassistant.const import CONF_HOST, CONF_MONITORED_CONDITIONS  # noqa: E402
+from homeassistant.setup import async_setup_component  # noqa: E402
+
+from emulator import DeviceEmulator  # noqa: E402
+
+DOMAIN = "mypv"
+MONITORED_CONDITIONS = [
+    "power_act",
+    "temp1",
+    "temp_ps",
+    "fan_speed",
+    "freq",
+    "volt_mains",
+    "power_solar_act",
+    "power_grid_act",
+]
+
+
+def config_dir():
+    """Return a new configuration directory with the integration linked in."""
+    path = tempfile.mkdtemp(prefix="mypv-")
+    os.mkdir(os.path.join(path, "custom_components"))
+    os.symlink(
+        os.path.join(ROOT, "custom_components", DOMAIN),
+        os.path.join(path, "custom_components", DOMAIN),
+    )
+    return path
+
+
+async def async_start_hass(path=None, config=None):
+    """Start Home Assistant and set up the integration."""
+    hass = core.HomeAssistant(path or config_dir())
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await loader.async_get_custom_components(hass)
+    await bootstrap.async_load_base_functionality(hass)
+    await hass.async_start()
+    assert await async_setup_component(hass, DOMAIN, config or {})
+    return hass
+
+
+async def async_add_device(hass, host, conditions=MONITORED_CONDITIONS, options=None):
+    """Add and set up a config entry for an emulated device."""
+    entry = ConfigEntry(
+        version=1,
+        minor_version=1,
+        domain=DOMAIN,
+        title=host,
+        data={
+            CONF_HOST: host,
+            CONF_MONITORED_CONDITIONS: list(conditions),
+            "_filtered_sensor_types": {},
+        },
+        source="user",
+        options=options or {},
+        unique_id=None,
+    )
+    await hass.config_entries.async_add(entry)
+    await hass.async_block_till_done()
+    return entry
+
+
+async def async_stop_hass(hass):
+    """Stop Home Assistant."""
+    await hass.async_stop()
+
+
+async def _main():
+    emulator = DeviceEmulator(2)
+    await emulator.async_start()
+    hass = await async_start_hass()
+    for host in emulator.hosts:
+        entry = await async_add_device(hass, host)
+        print(host, entry.state)
+    print(sorted(hass.states.async_entity_ids())[:10])
+    await async_stop_hass(hass)
+    await emulator.async_stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
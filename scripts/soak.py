@@ -0,0 +1,199 @@
+"""Soak test of the integration against faulty emulated devices.
+
+The emulated devices run in a child process and drop connections, leave
+requests unanswered, return malformed JSON and HTTP errors. The
+integration polls them at a short interval, entries are reloaded in turn
+and debug logging of the integration is formatted into a null stream.
+
+Every sample records traced memory, open sockets and file descriptors,
+threads and asyncio tasks. After the warmup memory is compared by call
+site between snapshots, the largest growers are printed. The run fails
+when a counter keeps growing past its warmup level, when memory keeps
+growing at a call site or in total, when a log record could not be
+formatted or when the event loop reports an unhandled exception.
+
+    python scripts/soak.py --devices 5 --duration 300
+"""
+import argparse
+import asyncio
+from collections import Counter
+from datetime import timedelta
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from time import monotonic
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DOMAIN, async_add_device, async_start_hass, async_stop_hass  # noqa: E402
+import emulator  # noqa: E402
+
+FAULTS = {"flap": 0.05, "timeout": 0.02, "malformed": 0.05, "http_error": 0.03}
+# Allowed growth of the counters over their level after the warmup
+TOLERANCE = {"sockets": 2, "fds": 4, "threads": 4, "tasks": 10}
+SITE_LIMIT = 256 * 1024
+TOTAL_LIMIT = 2 * 1024 * 1024
+
+
+class _CountingHandler(logging.Handler):
+    """Format every record into nothing and count the failures."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.errors = Counter()
+
+    def emit(self, record):
+        try:
+            self.format(record)
+        except Exception as error:
+            self.errors[f"{record.pathname}:{record.lineno} {error!r}"] += 1
+
+
+class _LoopErrors(Counter):
+    """Exception handler of the event loop counting what it reports."""
+
+    def __call__(self, loop, context):
+        exception = context.get("exception")
+        self[f"{context['message']}: {exception!r}"] += 1
+        loop.default_exception_handler(context)
+
+
+def resources():
+    """Return the resource counters of this process."""
+    sockets = 0
+    descriptors = os.listdir("/proc/self/fd")
+    for descriptor in descriptors:
+        try:
+            if os.readlink(f"/proc/self/fd/{descriptor}").startswith("socket:"):
+                sockets += 1
+        except OSError:
+            continue
+    return {
+        "memory": tracemalloc.get_traced_memory()[0],
+        "sockets": sockets,
+        "fds": len(descriptors),
+        "threads": threading.active_count(),
+        "tasks": len(asyncio.all_tasks()),
+    }
+
+
+def site_growth(older, newer, limit=10):
+    """Return the call sites that grew most between two snapshots."""
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = newer.filter_traces(filters).compare_to(older.filter_traces(filters), "lineno")
+    return [stat for stat in stats if stat.size_diff > 0][:limit]
+
+
+async def _main(args):
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    devices = context.Process(
+        target=emulator.serve, args=(args.devices, FAULTS, child), daemon=True
+    )
+    devices.start()
+    hosts = parent.recv()
+
+    handler = _CountingHandler()
+    logger = logging.getLogger(f"custom_components.{DOMAIN}")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    loop_errors = _LoopErrors()
+    asyncio.get_running_loop().set_exception_handler(loop_errors)
+
+    tracemalloc.start(args.frames)
+    hass = await async_start_hass()
+    from custom_components.mypv.const import DATA_COORDINATOR
+
+    entries = [await async_add_device(hass, host) for host in hosts]
+
+    def set_intervals():
+        for entry in entries:
+            coordinator = hass.data[DOMAIN].get(entry.entry_id, {}).get(DATA_COORDINATOR)
+            if coordinator is not None and coordinator._base_interval != interval:
+                coordinator._base_interval = interval
+                coordinator._apply_load_level()
+
+    interval = timedelta(seconds=args.interval)
+    set_intervals()
+
+    started = monotonic()
+    next_reload = started + args.reload_every
+    reloads = 0
+    samples = []
+    # Memory is compared between the end of the warmup, the middle and the end.
+    checkpoints = [args.warmup, (args.warmup + args.duration) / 2]
+    snapshots = []
+    print("   time   memory  sockets  fds  threads  tasks")
+    while (elapsed := monotonic() - started) < args.duration:
+        await asyncio.sleep(args.sample_every)
+        if monotonic() >= next_reload:
+            entry = entries[reloads % len(entries)]
+            await hass.config_entries.async_reload(entry.entry_id)
+            reloads += 1
+            next_reload += args.reload_every
+        set_intervals()
+        sample = resources()
+        samples.append((elapsed, sample))
+        if len(snapshots) < len(checkpoints) and elapsed >= checkpoints[len(snapshots)]:
+            snapshots.append(tracemalloc.take_snapshot())
+        print(
+            f"{elapsed:7.0f} {sample['memory'] / 1024:7.0f}K {sample['sockets']:7d} "
+            f"{sample['fds']:4d} {sample['threads']:8d} {sample['tasks']:6d}"
+        )
+
+    snapshots.append(tracemalloc.take_snapshot())
+    await async_stop_hass(hass)
+    devices.terminate()
+
+    failures = [
+        f"{count} log records failed to format at {error}" for error, count in handler.errors.items()
+    ]
+    failures += [f"{count} times {error}" for error, count in loop_errors.items()]
+    steady = [sample for elapsed, sample in samples if elapsed >= args.warmup]
+    if len(steady) < 6 or len(snapshots) < 3:
+        raise SystemExit("Run too short for the growth checks, raise --duration")
+    third = len(steady) // 3
+    for key, tolerance in TOLERANCE.items():
+        start_level = max(sample[key] for sample in steady[:third])
+        end_level = max(sample[key] for sample in steady[-third:])
+        if end_level > start_level + tolerance:
+            failures.append(f"{key} grew from {start_level} to {end_level}")
+
+    first, middle, last = snapshots
+    print(f"\nlargest growth by call site since {checkpoints[1]:.0f} s:")
+    earlier = {stat.traceback[0]: stat.size_diff for stat in site_growth(first, middle, 1000)}
+    for stat in site_growth(middle, last):
+        frame = stat.traceback[0]
+        print(f"{stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7d}  {frame.filename}:{frame.lineno}")
+        if stat.size_diff > SITE_LIMIT and earlier.get(frame, 0) > 0:
+            failures.append(f"memory keeps growing at {frame.filename}:{frame.lineno}")
+    total = sum(stat.size for stat in last.statistics("filename")) - sum(
+        stat.size for stat in middle.statistics("filename")
+    )
+    if total > TOTAL_LIMIT:
+        failures.append(f"traced memory grew by {total / 1024:.0f} KiB in the second half")
+
+    print(f"\n{reloads} reloads, {len(samples)} samples")
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        raise SystemExit(1)
+    print("no unbounded growth found")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=300)
+    parser.add_argument("--warmup", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=0.5, help="poll interval in seconds")
+    parser.add_argument("--sample-every", type=float, default=5)
+    parser.add_argument("--reload-every", type=float, default=20)
+    parser.add_argument("--frames", type=int, default=1, help="traceback depth of tracemalloc")
+    asyncio.run(_main(parser.parse_args()))